@@ -5,6 +5,34 @@ from .repository import (
     TransactionRepository,
     PurchaseRepository,
     SettlementRepository,
+    AsyncWalletRepository,
+    AsyncPurchaseRepository,
+    IdempotencyKeyRepository,
+    AsyncIdempotencyKeyRepository,
+    SettlementOutboxRepository,
+    ReconciliationRepository,
+    OrderBookRepository,
+)
+from .catalog import MarketCatalog, market_catalog, publish_prices
+from .exchange import (
+    CircuitBreaker,
+    CircuitOpenError,
+    ExchangeClient,
+    ExchangeError,
+    OrderLeg,
+    exchange_client,
+)
+from .events import (
+    EventBroker,
+    event_broker,
+    publish_purchase_events,
+    publish_settlement_events,
+)
+from .ledger import (
+    LedgerFilter,
+    LedgerFormat,
+    LedgerTable,
+    stream_ledger,
 )
 
 
@@ -15,4 +43,28 @@ __all__ = (
     "TransactionRepository",
     "PurchaseRepository",
     "SettlementRepository",
+    "AsyncWalletRepository",
+    "AsyncPurchaseRepository",
+    "IdempotencyKeyRepository",
+    "AsyncIdempotencyKeyRepository",
+    "SettlementOutboxRepository",
+    "ReconciliationRepository",
+    "OrderBookRepository",
+    "MarketCatalog",
+    "market_catalog",
+    "publish_prices",
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "ExchangeClient",
+    "ExchangeError",
+    "OrderLeg",
+    "exchange_client",
+    "EventBroker",
+    "event_broker",
+    "publish_purchase_events",
+    "publish_settlement_events",
+    "LedgerFilter",
+    "LedgerFormat",
+    "LedgerTable",
+    "stream_ledger",
 )
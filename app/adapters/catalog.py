@@ -0,0 +1,119 @@
+import json
+from decimal import Decimal
+from logging import getLogger
+
+from sqlalchemy import Engine, func
+from sqlmodel import Session, select
+
+from app.adapters.notify import NotificationListener
+from app.models import Currency, Market
+
+logger = getLogger(__name__)
+
+MARKET_CATALOG_CHANNEL = "market_catalog"
+MARKET_PRICES_CHANNEL = "market_prices"
+# NOTIFY payloads are limited to 8000 bytes
+PRICES_PER_NOTIFY = 200
+
+
+def publish_prices(session: Session, prices: dict[int, Decimal]) -> None:
+    """
+    Sends the latest prices to every process' catalog. Delivered on commit.
+    """
+    items = list(prices.items())
+    for start in range(0, len(items), PRICES_PER_NOTIFY):
+        payload = json.dumps(
+            {
+                str(market_id): str(price)
+                for market_id, price in items[start : start + PRICES_PER_NOTIFY]
+            }
+        )
+        session.execute(select(func.pg_notify(MARKET_PRICES_CHANNEL, payload)))
+
+
+class MarketCatalog:
+    """
+    In-process copy of the markets and currencies tables, keyed by symbol
+    and id. A trigger on both tables sends a NOTIFY on every change and each
+    process reloads its copy when it hears one, so API and Celery workers
+    stay consistent without querying markets on every request.
+
+    Lookups return None when the catalog isn't started or doesn't know the
+    key yet; callers fall back to the database in that case.
+
+    Live prices arrive separately on the market_prices channel from the price
+    feed, which only writes them to the markets table at a throttled rate.
+    """
+
+    def __init__(self) -> None:
+        self._markets_by_symbol: dict[str, Market] = {}
+        self._markets_by_id: dict[int, Market] = {}
+        self._currencies_by_id: dict[int, Currency] = {}
+        self._prices: dict[int, Decimal] = {}
+        self._engine: Engine | None = None
+        self._listener: NotificationListener | None = None
+
+    def start(self, engine: Engine) -> None:
+        self._engine = engine
+        self.refresh()
+        self._listener = NotificationListener(
+            engine.url.set(drivername="postgresql").render_as_string(
+                hide_password=False
+            ),
+            {
+                MARKET_CATALOG_CHANNEL: lambda _: self.refresh(),
+                MARKET_PRICES_CHANNEL: self.update_prices,
+            },
+            # Ticks may have been missed while disconnected, start over from
+            # the stored prices
+            on_connect=lambda: self.refresh(reset_prices=True),
+        )
+        self._listener.start()
+
+    def stop(self) -> None:
+        if self._listener:
+            self._listener.stop()
+            self._listener = None
+        self.clear()
+
+    def refresh(self, reset_prices: bool = False) -> None:
+        if not self._engine:
+            return
+        with Session(self._engine) as session:
+            markets = session.exec(select(Market)).all()
+            currencies = session.exec(select(Currency)).all()
+        # Rebinding whole dicts keeps concurrent readers on a consistent snapshot
+        self._markets_by_symbol = {market.symbol: market for market in markets}
+        self._markets_by_id = {market.id: market for market in markets}
+        self._currencies_by_id = {currency.id: currency for currency in currencies}
+        stored = {market.id: market.price for market in markets}
+        self._prices = stored if reset_prices else {**stored, **self._prices}
+        logger.info("Market catalog loaded %s markets", len(markets))
+
+    def update_prices(self, payload: str) -> None:
+        prices = {
+            int(market_id): Decimal(price)
+            for market_id, price in json.loads(payload).items()
+        }
+        self._prices = {**self._prices, **prices}
+
+    def clear(self) -> None:
+        self._markets_by_symbol = {}
+        self._markets_by_id = {}
+        self._currencies_by_id = {}
+        self._prices = {}
+
+    def get_by_symbol(self, symbol: str) -> Market | None:
+        return self._markets_by_symbol.get(symbol)
+
+    def get_by_id(self, id: int) -> Market | None:
+        return self._markets_by_id.get(id)
+
+    def get_currency(self, id: int) -> Currency | None:
+        return self._currencies_by_id.get(id)
+
+    def get_price(self, market: Market) -> Decimal:
+        return self._prices.get(market.id, market.price)
+
+
+market_catalog = MarketCatalog()
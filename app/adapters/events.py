@@ -0,0 +1,163 @@
+import asyncio
+import json
+import uuid
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from logging import getLogger
+from typing import Any
+
+from sqlalchemy import Engine, Select, func, select
+from sqlmodel import Session
+
+from app.adapters.notify import NotificationListener
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models import Purchase, SettlementStatus
+
+logger = getLogger(__name__)
+
+PURCHASE_EVENTS_CHANNEL = "purchase_events"
+SETTLEMENT_EVENTS_CHANNEL = "settlement_events"
+# Keeps each NOTIFY payload well under the 8000 byte limit
+EVENTS_PER_NOTIFY = 30
+
+
+def notify_statements(channel: str, events: list[dict[str, Any]]) -> list[Select]:
+    return [
+        select(
+            func.pg_notify(
+                channel, json.dumps(events[start : start + EVENTS_PER_NOTIFY])
+            )
+        )
+        for start in range(0, len(events), EVENTS_PER_NOTIFY)
+    ]
+
+
+def purchase_event_statements(purchases: Iterable[Purchase]) -> list[Select]:
+    events = [
+        {
+            "purchase_id": str(purchase.id),
+            "user_id": str(purchase.user_id),
+            "market_id": purchase.market_id,
+            "status": purchase.status,
+            "amount": str(purchase.amount),
+            "price": str(purchase.price),
+        }
+        for purchase in purchases
+    ]
+    return notify_statements(PURCHASE_EVENTS_CHANNEL, events)
+
+
+def settlement_event_statements(
+    orders: Iterable[tuple[int, str, SettlementStatus]],
+) -> list[Select]:
+    events = [
+        {"market_id": market_id, "order_id": order_id, "status": status}
+        for market_id, order_id, status in orders
+    ]
+    return notify_statements(SETTLEMENT_EVENTS_CHANNEL, events)
+
+
+def publish_purchase_events(session: Session, purchases: Iterable[Purchase]) -> None:
+    """
+    Announces purchase status changes, delivered when the transaction commits.
+    """
+    for statement in purchase_event_statements(purchases):
+        session.execute(statement)
+
+
+def publish_settlement_events(
+    session: Session, orders: Iterable[tuple[int, str, SettlementStatus]]
+) -> None:
+    """
+    Announces settlement orders of (market_id, order_id, status) on commit.
+    """
+    for statement in settlement_event_statements(orders):
+        session.execute(statement)
+
+
+@dataclass(eq=False)
+class Subscription:
+    user_id: uuid.UUID
+    # None subscribes to settlements of every market
+    market_ids: set[int] | None
+    queue: asyncio.Queue[tuple[str, dict[str, Any]] | None] = field(
+        default_factory=lambda: asyncio.Queue(
+            maxsize=settings.EVENTS_SUBSCRIBER_QUEUE_SIZE
+        )
+    )
+
+    def wants(self, channel: str, event: dict[str, Any]) -> bool:
+        if channel == PURCHASE_EVENTS_CHANNEL:
+            return event["user_id"] == str(self.user_id)
+        return self.market_ids is None or event["market_id"] in self.market_ids
+
+
+class EventBroker:
+    """
+    One LISTEN connection per process fanning purchase and settlement events
+    out to every connected client's queue. Clients too slow to keep up are
+    disconnected rather than buffered without bound.
+    """
+
+    def __init__(self) -> None:
+        self._subscriptions: set[Subscription] = set()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._listener: NotificationListener | None = None
+
+    def start(self, engine: Engine, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+        self._listener = NotificationListener(
+            engine.url.set(drivername="postgresql").render_as_string(
+                hide_password=False
+            ),
+            {
+                PURCHASE_EVENTS_CHANNEL: lambda payload: self._publish(
+                    PURCHASE_EVENTS_CHANNEL, payload
+                ),
+                SETTLEMENT_EVENTS_CHANNEL: lambda payload: self._publish(
+                    SETTLEMENT_EVENTS_CHANNEL, payload
+                ),
+            },
+        )
+        self._listener.start()
+
+    def stop(self) -> None:
+        if self._listener:
+            self._listener.stop()
+            self._listener = None
+
+    def subscribe(
+        self, user_id: uuid.UUID, market_ids: set[int] | None
+    ) -> Subscription:
+        subscription = Subscription(user_id, market_ids)
+        self._subscriptions.add(subscription)
+        metrics.incr("events.subscribed")
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscriptions.discard(subscription)
+
+    def _publish(self, channel: str, payload: str) -> None:
+        # Runs on the listener thread, queues belong to the event loop
+        if self._loop is not None:
+            events = json.loads(payload)
+            self._loop.call_soon_threadsafe(self._fan_out, channel, events)
+
+    def _fan_out(self, channel: str, events: list[dict[str, Any]]) -> None:
+        for subscription in list(self._subscriptions):
+            for event in events:
+                if not subscription.wants(channel, event):
+                    continue
+                try:
+                    subscription.queue.put_nowait((channel, event))
+                except asyncio.QueueFull:
+                    metrics.incr("events.dropped_subscribers")
+                    self._subscriptions.discard(subscription)
+                    # Make room for the sentinel that ends the client's stream
+                    subscription.queue.get_nowait()
+                    subscription.queue.put_nowait(None)
+                    break
+
+
+event_broker = EventBroker()
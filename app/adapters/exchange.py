@@ -0,0 +1,259 @@
+import asyncio
+import os
+import threading
+import time
+from collections.abc import Callable, Coroutine
+from dataclasses import dataclass
+from decimal import Decimal
+from logging import getLogger
+from typing import Any, TypeVar
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ExchangeError(Exception):
+    pass
+
+
+class CircuitOpenError(ExchangeError):
+    pass
+
+
+@dataclass(frozen=True)
+class OrderLeg:
+    symbol: str
+    amount: Decimal
+    client_order_id: str
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls
+    for `reset_timeout` seconds, then lets a single trial call through.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial_running = False
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial_running:
+                return False
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class ExchangeClient:
+    """
+    Client for the exchange's order API. It keeps one pooled httpx
+    AsyncClient per process, bounds concurrent orders and trips a circuit
+    breaker when the exchange keeps failing.
+
+    The client lives on its own event loop thread, so sync callers (Celery
+    tasks, the settlement consumer) and async callers share the same pool.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        timeout: float,
+        max_connections: int,
+        max_concurrency: int,
+        breaker: CircuitBreaker,
+        max_legs: int = 50,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.max_legs = max_legs
+        self.breaker = breaker
+        self.transport = transport
+        self._lock = threading.Lock()
+        self._pid: int | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._client: httpx.AsyncClient | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+
+    def buy(self, symbol: str, amount: Decimal, client_order_id: str) -> str:
+        return self._run(self._buy(symbol, amount, client_order_id))
+
+    async def abuy(self, symbol: str, amount: Decimal, client_order_id: str) -> str:
+        return await self._arun(self._buy(symbol, amount, client_order_id))
+
+    async def _buy(self, symbol: str, amount: Decimal, client_order_id: str) -> str:
+        return await self._post(
+            "/orders",
+            {
+                "symbol": symbol,
+                "amount": str(amount),
+                "client_order_id": client_order_id,
+            },
+            lambda body: body["transaction_code"],
+        )
+
+    def buy_many(self, legs: list[OrderLeg]) -> dict[str, str]:
+        return self._run(self._buy_many(legs))
+
+    async def abuy_many(self, legs: list[OrderLeg]) -> dict[str, str]:
+        return await self._arun(self._buy_many(legs))
+
+    async def _buy_many(self, legs: list[OrderLeg]) -> dict[str, str]:
+        """
+        Sends the legs as multi-leg orders of at most `max_legs` each, in
+        parallel, and maps client order ids to transaction codes. Legs of a
+        failed request are left out of the result.
+        """
+        chunks = [
+            legs[start : start + self.max_legs]
+            for start in range(0, len(legs), self.max_legs)
+        ]
+        results = await asyncio.gather(
+            *(self._buy_chunk(chunk) for chunk in chunks), return_exceptions=True
+        )
+        fills: dict[str, str] = {}
+        for chunk, result in zip(chunks, results, strict=True):
+            if isinstance(result, ExchangeError):
+                logger.warning(
+                    "Multi-leg order of %s legs failed: %s", len(chunk), result
+                )
+                continue
+            if isinstance(result, BaseException):
+                raise result
+            fills.update(result)
+        return fills
+
+    async def _buy_chunk(self, legs: list[OrderLeg]) -> dict[str, str]:
+        return await self._post(
+            "/orders/batch",
+            {
+                "legs": [
+                    {
+                        "symbol": leg.symbol,
+                        "amount": str(leg.amount),
+                        "client_order_id": leg.client_order_id,
+                    }
+                    for leg in legs
+                ]
+            },
+            lambda body: {
+                fill["client_order_id"]: fill["transaction_code"]
+                for fill in body["fills"]
+            },
+        )
+
+    async def _post(
+        self, path: str, payload: dict[str, Any], parse: Callable[[Any], T]
+    ) -> T:
+        """
+        Posts to the exchange and parses its answer with `parse`. A malformed
+        answer counts as a failure just like an HTTP error.
+        """
+        if not self.breaker.allow():
+            metrics.incr("exchange.rejected")
+            raise CircuitOpenError("Exchange circuit is open")
+        assert self._client is not None and self._semaphore is not None
+        async with self._semaphore:
+            start = time.perf_counter()
+            try:
+                response = await self._client.post(path, json=payload)
+                response.raise_for_status()
+                result = parse(response.json())
+            except (httpx.HTTPError, ValueError, KeyError, TypeError) as e:
+                self.breaker.record_failure()
+                metrics.incr("exchange.failures")
+                raise ExchangeError(str(e)) from e
+            finally:
+                metrics.observe("exchange.latency", time.perf_counter() - start)
+        self.breaker.record_success()
+        return result
+
+    def _run(self, coroutine: Coroutine[Any, Any, T]) -> T:
+        future = asyncio.run_coroutine_threadsafe(coroutine, self._ensure_loop())
+        return future.result()
+
+    async def _arun(self, coroutine: Coroutine[Any, Any, T]) -> T:
+        future = asyncio.run_coroutine_threadsafe(coroutine, self._ensure_loop())
+        return await asyncio.wrap_future(future)
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        # Threads don't survive fork, a forked child builds its own loop
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._loop.run_forever, name="exchange-client", daemon=True
+                ).start()
+                asyncio.run_coroutine_threadsafe(self._open(), self._loop).result()
+            return self._loop
+
+    async def _open(self) -> None:
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+            ),
+            transport=self.transport,
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                return
+            if self._client is not None:
+                asyncio.run_coroutine_threadsafe(
+                    self._client.aclose(), self._loop
+                ).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+            self._client = None
+
+
+exchange_client = ExchangeClient(
+    settings.EXCHANGE_BASE_URL,
+    timeout=settings.EXCHANGE_TIMEOUT_SECONDS,
+    max_connections=settings.EXCHANGE_MAX_CONNECTIONS,
+    max_concurrency=settings.EXCHANGE_MAX_CONCURRENCY,
+    breaker=CircuitBreaker(
+        settings.EXCHANGE_BREAKER_FAILURES, settings.EXCHANGE_BREAKER_RESET_SECONDS
+    ),
+    max_legs=settings.EXCHANGE_BATCH_MAX_LEGS,
+)
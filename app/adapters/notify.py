@@ -0,0 +1,72 @@
+import threading
+from collections.abc import Callable
+from logging import getLogger
+
+import psycopg
+from psycopg import sql
+
+logger = getLogger(__name__)
+
+
+class NotificationListener:
+    """
+    Holds a dedicated LISTEN connection in a daemon thread and hands every
+    NOTIFY payload to the handler registered for its channel.
+
+    `on_connect` runs after each (re)connect, so consumers can resync state
+    for notifications that were sent while the connection was down.
+    """
+
+    def __init__(
+        self,
+        conninfo: str,
+        handlers: dict[str, Callable[[str], None]],
+        on_connect: Callable[[], None] | None = None,
+        reconnect_delay: float = 1.0,
+        poll_timeout: float = 1.0,
+    ) -> None:
+        self.conninfo = conninfo
+        self.handlers = handlers
+        self.on_connect = on_connect
+        self.reconnect_delay = reconnect_delay
+        self.poll_timeout = poll_timeout
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="pg-notify-listener", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.poll_timeout * 2)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                with psycopg.connect(self.conninfo, autocommit=True) as conn:
+                    for channel in self.handlers:
+                        conn.execute(
+                            sql.SQL("LISTEN {}").format(sql.Identifier(channel))
+                        )
+                    if self.on_connect:
+                        self.on_connect()
+                    while not self._stop.is_set():
+                        for notify in conn.notifies(timeout=self.poll_timeout):
+                            self._dispatch(notify.channel, notify.payload)
+            except psycopg.Error as e:
+                logger.warning("LISTEN connection lost: %s", e)
+                self._stop.wait(self.reconnect_delay)
+
+    def _dispatch(self, channel: str, payload: str) -> None:
+        try:
+            self.handlers[channel](payload)
+        except Exception:
+            logger.exception("Notification handler for %s failed", channel)
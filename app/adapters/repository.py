@@ -1,7 +1,27 @@
 import abc
-from datetime import datetime
-from typing import List
-from sqlmodel import Session, select
+import uuid
+from collections.abc import Iterable
+from datetime import datetime, timezone
+from typing import Any
+from decimal import Decimal
+from sqlalchemy import (
+    Integer,
+    Numeric,
+    Row,
+    String,
+    column,
+    delete,
+    func,
+    insert,
+    or_,
+    text,
+    tuple_,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlmodel import Session, col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.models import (
     Currency,
@@ -11,8 +31,14 @@ from app.models import (
     WalletUpdate,
     User,
     Purchase,
+    PurchaseStatus,
     Settlement,
+    SettlementStatus,
     SettlementUpdate,
+    IdempotencyKey,
+    OrderBookSnapshot,
+    SettlementOutbox,
+    WalletReconciliation,
 )
 
 
@@ -55,6 +81,52 @@ class WalletRepository(abc.ABC):
             return None
         return wallet
 
+    def get_by_currencies_for_update(
+        self, session: Session, currency_ids: Iterable[int], user: User
+    ) -> dict[int, Wallet]:
+        # Lock in a stable order so concurrent batches of one user can't deadlock
+        statement = (
+            select(Wallet)
+            .where(col(Wallet.currency_id).in_(set(currency_ids)))
+            .where(Wallet.user_id == user.id)
+            .order_by(Wallet.id)
+            .with_for_update()
+        )
+        wallets = session.exec(statement).all()
+        return {wallet.currency_id: wallet for wallet in wallets}
+
+    def get_by_owners_for_update(
+        self, session: Session, owners: Iterable[tuple[uuid.UUID, int]]
+    ) -> dict[tuple[uuid.UUID, int], Wallet]:
+        """
+        Locks the wallets of many (user_id, currency_id) pairs at once, in id
+        order like get_by_currencies_for_update.
+        """
+        statement = (
+            select(Wallet)
+            .where(tuple_(Wallet.user_id, Wallet.currency_id).in_(list(set(owners))))
+            .order_by(Wallet.id)
+            .with_for_update()
+        )
+        wallets = session.exec(statement).all()
+        return {(wallet.user_id, wallet.currency_id): wallet for wallet in wallets}
+
+
+class AsyncWalletRepository(WalletRepository):
+    async def get_by_currency_for_update(  # type: ignore[override]
+        self, session: AsyncSession, currency_id: int, user: User
+    ) -> Wallet | None:
+        statement = (
+            select(Wallet)
+            .where(Wallet.currency_id == currency_id)
+            .where(Wallet.user_id == user.id)
+            .with_for_update()
+        )
+        wallet = (await session.exec(statement)).first()
+        if not wallet:
+            return None
+        return wallet
+
 
 class TransactionRepository(abc.ABC):
     def new(self, session: Session, transaction: Transaction) -> Transaction:
@@ -62,6 +134,15 @@ class TransactionRepository(abc.ABC):
         session.add(db_obj)
         return db_obj
 
+    def new_many(
+        self, session: Session, transactions: list[Transaction]
+    ) -> list[Transaction]:
+        if transactions:
+            session.execute(
+                insert(Transaction), [obj.model_dump() for obj in transactions]
+            )
+        return transactions
+
     def get_by_currency_for_update(
         self, session: Session, currency_id: int
     ) -> Wallet | None:
@@ -87,6 +168,127 @@ class MarketRepository(abc.ABC):
         settlement = session.exec(statement).first()
         return settlement
 
+    def update_prices(self, session: Session, prices: dict[int, Decimal]) -> None:
+        # One UPDATE ... FROM (VALUES ...) for all changed markets
+        if not prices:
+            return
+        latest = values(
+            column("market_id", Integer), column("price", Numeric(16, 6)), name="prices"
+        ).data(list(prices.items()))
+        statement = (
+            update(Market)
+            .where(Market.id == latest.c.market_id)
+            .values(price=latest.c.price, updated_at=func.now())
+            .execution_options(synchronize_session=False)
+        )
+        session.execute(statement)
+
+
+# Debits the qoute wallet only if it covers the cost, credits the base wallet,
+# writes both ledger rows and the purchase in a single statement. Every
+# sub-statement only produces rows when the ones before it did, and the outer
+# SELECT reports what happened so the caller can roll back a partial debit.
+ATOMIC_PURCHASE_STATEMENT = text(
+    """
+    WITH qoute AS (
+        UPDATE wallets
+        SET balance = balance - :total_price, updated_at = :now
+        WHERE user_id = :user_id
+          AND currency_id = :qoute_currency_id
+          AND balance - locked >= :total_price
+        RETURNING id
+    ),
+    base AS (
+        UPDATE wallets
+        SET balance = balance + :amount, updated_at = :now
+        WHERE user_id = :user_id
+          AND currency_id = :base_currency_id
+          AND EXISTS (SELECT 1 FROM qoute)
+        RETURNING id
+    ),
+    ledger AS (
+        INSERT INTO transactions
+            (id, created_at, updated_at, amount, status, type, wallet_id)
+        SELECT
+            :base_transaction_id, :now, :now, :amount,
+            'DONE'::transactionstatus, 'CREDIT'::transactiontype, base.id
+        FROM base
+        UNION ALL
+        SELECT
+            :qoute_transaction_id, :now, :now, :total_price,
+            'DONE'::transactionstatus, 'DEBT'::transactiontype, qoute.id
+        FROM qoute, base
+        RETURNING id
+    ),
+    purchase AS (
+        INSERT INTO purchases
+            (id, created_at, updated_at, status, amount, price, user_id, market_id)
+        SELECT :purchase_id, :now, :now, 'DONE', :amount, :total_price, :user_id, :market_id
+        FROM qoute, base
+        RETURNING id
+    )
+    SELECT
+        (SELECT id FROM purchase) AS purchase_id,
+        (
+            SELECT count(*) FROM wallets
+            WHERE user_id = :user_id
+              AND currency_id IN (:base_currency_id, :qoute_currency_id)
+        ) AS wallets
+    """
+)
+
+
+# Moves the cost into the qoute wallet's locked funds and inserts a PENDING
+# purchase, leaving the balances and the ledger to the purchase finalizer.
+# The base wallet is only checked for, it isn't locked.
+QUEUED_PURCHASE_STATEMENT = text(
+    """
+    WITH qoute AS (
+        UPDATE wallets
+        SET locked = locked + :total_price, updated_at = :now
+        WHERE user_id = :user_id
+          AND currency_id = :qoute_currency_id
+          AND balance - locked >= :total_price
+          AND EXISTS (
+              SELECT 1 FROM wallets
+              WHERE user_id = :user_id AND currency_id = :base_currency_id
+          )
+        RETURNING id
+    ),
+    purchase AS (
+        INSERT INTO purchases
+            (id, created_at, updated_at, status, amount, price, user_id, market_id)
+        SELECT :purchase_id, :now, :now, 'PENDING', :amount, :total_price, :user_id, :market_id
+        FROM qoute
+        RETURNING id
+    )
+    SELECT
+        (SELECT id FROM purchase) AS purchase_id,
+        (
+            SELECT count(*) FROM wallets
+            WHERE user_id = :user_id
+              AND currency_id IN (:base_currency_id, :qoute_currency_id)
+        ) AS wallets
+    """
+)
+
+
+def atomic_purchase_params(
+    purchase: Purchase, base_currency_id: int, qoute_currency_id: int
+) -> dict[str, Any]:
+    return {
+        "now": purchase.created_at,
+        "user_id": purchase.user_id,
+        "market_id": purchase.market_id,
+        "amount": purchase.amount,
+        "total_price": purchase.price,
+        "purchase_id": purchase.id,
+        "base_currency_id": base_currency_id,
+        "qoute_currency_id": qoute_currency_id,
+        "base_transaction_id": uuid.uuid4(),
+        "qoute_transaction_id": uuid.uuid4(),
+    }
+
 
 class PurchaseRepository(abc.ABC):
 
@@ -95,11 +297,244 @@ class PurchaseRepository(abc.ABC):
         settlement = session.exec(purchase).first()
         return settlement
 
+    def get_by_ids(self, session: Session, ids: Iterable[str]) -> list[Purchase]:
+        statement = select(Purchase).where(col(Purchase.id).in_(list(ids)))
+        return list(session.exec(statement).all())
+
+    def history_statement(self, user_id: uuid.UUID) -> Any:
+        # Newest first, (created_at, id) is unique and follows the user index
+        return (
+            select(
+                Purchase.id,
+                Purchase.status,
+                Purchase.amount,
+                Purchase.price,
+                Purchase.market_id,
+                Purchase.created_at,
+            )
+            .where(Purchase.user_id == user_id)
+            .order_by(col(Purchase.created_at).desc(), col(Purchase.id).desc())
+        )
+
+    def get_history_page(
+        self,
+        session: Session,
+        user_id: uuid.UUID,
+        limit: int,
+        before: tuple[datetime, uuid.UUID] | None = None,
+    ) -> list[Row[Any]]:
+        statement = self.history_statement(user_id).limit(limit)
+        if before:
+            statement = statement.where(
+                tuple_(Purchase.created_at, Purchase.id) < tuple_(*before)
+            )
+        return list(session.exec(statement).all())
+
+    def stream_history(
+        self, session: Session, user_id: uuid.UUID, chunk_size: int
+    ) -> Iterable[Row[Any]]:
+        # yield_per streams from a server side cursor, chunk_size rows at a time
+        statement = self.history_statement(user_id).execution_options(
+            yield_per=chunk_size
+        )
+        return session.exec(statement)
+
     def new(self, session: Session, purchase: Purchase) -> Purchase:
         db_obj = Purchase.model_validate(purchase)
         session.add(db_obj)
         return db_obj
 
+    def new_many(self, session: Session, purchases: list[Purchase]) -> list[Purchase]:
+        if purchases:
+            session.execute(insert(Purchase), [obj.model_dump() for obj in purchases])
+        return purchases
+
+    def execute_atomic(
+        self,
+        session: Session,
+        purchase: Purchase,
+        base_currency_id: int,
+        qoute_currency_id: int,
+    ) -> Row[Any]:
+        return session.execute(
+            ATOMIC_PURCHASE_STATEMENT,
+            atomic_purchase_params(purchase, base_currency_id, qoute_currency_id),
+        ).one()
+
+    def execute_queued(
+        self,
+        session: Session,
+        purchase: Purchase,
+        base_currency_id: int,
+        qoute_currency_id: int,
+    ) -> Row[Any]:
+        return session.execute(
+            QUEUED_PURCHASE_STATEMENT,
+            atomic_purchase_params(purchase, base_currency_id, qoute_currency_id),
+        ).one()
+
+    def claim_unsettled(self, session: Session, ids: Iterable[str]) -> list[Row[Any]]:
+        """
+        Marks the purchases that aren't settled yet as settled and returns
+        their (id, amount) rows, purchases settled before are left out.
+        """
+        statement = (
+            update(Purchase)
+            .where(col(Purchase.id).in_(list(ids)), col(Purchase.settled_at).is_(None))
+            .values(settled_at=func.now())
+            .returning(Purchase.id, Purchase.amount)
+        )
+        return list(session.execute(statement).all())
+
+    def lock_pending(self, session: Session, limit: int) -> list[Purchase]:
+        # SKIP LOCKED lets several finalizers work through the queue side by side
+        statement = (
+            select(Purchase)
+            .where(Purchase.status == PurchaseStatus.PENDING)
+            .order_by(Purchase.created_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        return list(session.exec(statement).all())
+
+
+class AsyncPurchaseRepository(PurchaseRepository):
+    async def get_by_id(  # type: ignore[override]
+        self, session: AsyncSession, id: str
+    ) -> Purchase:
+        statement = select(Purchase).where(Purchase.id == id)
+        return (await session.exec(statement)).first()
+
+    async def execute_atomic(  # type: ignore[override]
+        self,
+        session: AsyncSession,
+        purchase: Purchase,
+        base_currency_id: int,
+        qoute_currency_id: int,
+    ) -> Row[Any]:
+        result = await session.execute(
+            ATOMIC_PURCHASE_STATEMENT,
+            atomic_purchase_params(purchase, base_currency_id, qoute_currency_id),
+        )
+        return result.one()
+
+    async def execute_queued(  # type: ignore[override]
+        self,
+        session: AsyncSession,
+        purchase: Purchase,
+        base_currency_id: int,
+        qoute_currency_id: int,
+    ) -> Row[Any]:
+        result = await session.execute(
+            QUEUED_PURCHASE_STATEMENT,
+            atomic_purchase_params(purchase, base_currency_id, qoute_currency_id),
+        )
+        return result.one()
+
+
+def idempotency_claim_statement(idempotency_key: IdempotencyKey):
+    # Takes over an expired key in place, a live key makes RETURNING empty
+    statement = pg_insert(IdempotencyKey).values(
+        **idempotency_key.model_dump(exclude={"id"})
+    )
+    return statement.on_conflict_do_update(
+        index_elements=["user_id", "key"],
+        set_={
+            "purchase_id": statement.excluded.purchase_id,
+            "created_at": statement.excluded.created_at,
+            "updated_at": statement.excluded.updated_at,
+            "expires_at": statement.excluded.expires_at,
+        },
+        where=col(IdempotencyKey.expires_at) <= statement.excluded.created_at,
+    ).returning(IdempotencyKey.id)
+
+
+class IdempotencyKeyRepository:
+    def get_purchase(self, session: Session, user: User, key: str) -> Purchase | None:
+        statement = (
+            select(Purchase)
+            .join(IdempotencyKey, IdempotencyKey.purchase_id == Purchase.id)
+            .where(IdempotencyKey.user_id == user.id)
+            .where(IdempotencyKey.key == key)
+            .where(IdempotencyKey.expires_at > datetime.now(timezone.utc))
+        )
+        return session.exec(statement).first()
+
+    def claim(self, session: Session, idempotency_key: IdempotencyKey) -> bool:
+        # The purchase row must exist before the key that references it
+        session.flush()
+        statement = idempotency_claim_statement(idempotency_key)
+        return session.execute(statement).first() is not None
+
+    def delete_expired(self, session: Session, limit: int) -> int:
+        expired = (
+            select(IdempotencyKey.id)
+            .where(IdempotencyKey.expires_at <= datetime.now(timezone.utc))
+            .limit(limit)
+        )
+        result = session.execute(
+            delete(IdempotencyKey).where(col(IdempotencyKey.id).in_(expired))
+        )
+        return result.rowcount
+
+
+class AsyncIdempotencyKeyRepository(IdempotencyKeyRepository):
+    async def get_purchase(  # type: ignore[override]
+        self, session: AsyncSession, user: User, key: str
+    ) -> Purchase | None:
+        statement = (
+            select(Purchase)
+            .join(IdempotencyKey, IdempotencyKey.purchase_id == Purchase.id)
+            .where(IdempotencyKey.user_id == user.id)
+            .where(IdempotencyKey.key == key)
+            .where(IdempotencyKey.expires_at > datetime.now(timezone.utc))
+        )
+        return (await session.exec(statement)).first()
+
+    async def claim(  # type: ignore[override]
+        self, session: AsyncSession, idempotency_key: IdempotencyKey
+    ) -> bool:
+        await session.flush()
+        statement = idempotency_claim_statement(idempotency_key)
+        return (await session.execute(statement)).first() is not None
+
+
+class SettlementOutboxRepository:
+    def new(self, session: Session, entry: SettlementOutbox) -> SettlementOutbox:
+        db_obj = SettlementOutbox.model_validate(entry)
+        session.add(db_obj)
+        return db_obj
+
+    def new_many(
+        self, session: Session, entries: list[SettlementOutbox]
+    ) -> list[SettlementOutbox]:
+        if entries:
+            session.execute(
+                insert(SettlementOutbox),
+                [obj.model_dump(exclude={"id"}) for obj in entries],
+            )
+        return entries
+
+    def lock_batch(self, session: Session, limit: int) -> list[SettlementOutbox]:
+        # SKIP LOCKED lets several relays drain the outbox side by side
+        statement = (
+            select(SettlementOutbox)
+            .order_by(SettlementOutbox.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        return list(session.exec(statement).all())
+
+    def delete_many(self, session: Session, ids: list[int]) -> None:
+        if ids:
+            session.execute(
+                delete(SettlementOutbox).where(col(SettlementOutbox.id).in_(ids))
+            )
+
+
+# Advisory lock namespace for merging a market's settlement stripes
+SETTLEMENT_MERGE_LOCK = 1
+
 
 class SettlementRepository(abc.ABC):
     def create(self, session: Session, settlement: Settlement) -> Settlement:
@@ -109,16 +544,159 @@ class SettlementRepository(abc.ABC):
         session.refresh(db_obj)
         return db_obj
 
-    def get_active_lock(self, session: Session, market_id: int) -> Settlement:
+    def get_active_lock(
+        self, session: Session, market_id: int, stripe: int = 0
+    ) -> Settlement:
         statement = (
             select(Settlement)
             .where(Settlement.market_id == market_id)
+            .where(Settlement.stripe == stripe)
             .where(Settlement.active == True)
             .with_for_update()
         )
         settlement = session.exec(statement).first()
         return settlement
 
+    def get_active_stripes_lock(
+        self, session: Session, market_id: int, stripes: Iterable[int]
+    ) -> dict[int, Settlement]:
+        statement = (
+            select(Settlement)
+            .where(Settlement.market_id == market_id)
+            .where(col(Settlement.stripe).in_(sorted(stripes)))
+            .where(col(Settlement.active))
+            .order_by(Settlement.stripe)
+            .with_for_update()
+        )
+        return {settlement.stripe: settlement for settlement in session.exec(statement)}
+
+    def create_active(self, session: Session, market_id: int, stripe: int) -> None:
+        # Concurrent creators race on the partial unique index, losers no-op
+        statement = (
+            pg_insert(Settlement)
+            .values(
+                **Settlement(
+                    amount=Decimal(0), active=True, market_id=market_id, stripe=stripe
+                ).model_dump(exclude={"id"})
+            )
+            .on_conflict_do_nothing(
+                index_elements=["market_id", "stripe"], index_where=text("active")
+            )
+        )
+        session.execute(statement)
+
+    def get_active_amount(self, session: Session, market_id: int) -> Decimal:
+        statement = (
+            select(func.coalesce(func.sum(Settlement.amount), 0))
+            .where(Settlement.market_id == market_id)
+            .where(col(Settlement.active))
+        )
+        return session.exec(statement).one()
+
+    def get_all_active_lock(self, session: Session, market_id: int) -> list[Settlement]:
+        # Always lock stripes in the same order so mergers can't deadlock
+        statement = (
+            select(Settlement)
+            .where(Settlement.market_id == market_id)
+            .where(col(Settlement.active))
+            .order_by(Settlement.stripe, Settlement.id)
+            .with_for_update()
+        )
+        return list(session.exec(statement).all())
+
+    def mark_order(
+        self,
+        session: Session,
+        order_id: str,
+        status: SettlementStatus,
+        transaction_code: str | None = None,
+    ) -> None:
+        statement = (
+            update(Settlement)
+            .where(Settlement.order_id == order_id)
+            .values(status=status, transaction_code=transaction_code)
+        )
+        session.execute(statement)
+
+    def claim_closed_orders(self, session: Session, limit: int) -> list[Row[Any]]:
+        """
+        Moves the stripes of up to `limit` closed orders to IN_FLIGHT and
+        returns their (order_id, market_id, amount) rows. Whole orders are
+        claimed, a concurrent claim of the same order matches no rows.
+        """
+        order_ids = (
+            select(Settlement.order_id)
+            .where(Settlement.status == SettlementStatus.CLOSED)
+            .group_by(Settlement.order_id)
+            .order_by(func.min(Settlement.updated_at))
+            .limit(limit)
+        )
+        statement = (
+            update(Settlement)
+            .where(
+                col(Settlement.order_id).in_(order_ids),
+                Settlement.status == SettlementStatus.CLOSED,
+            )
+            .values(status=SettlementStatus.IN_FLIGHT, updated_at=func.now())
+            .returning(Settlement.order_id, Settlement.market_id, Settlement.amount)
+        )
+        return list(session.execute(statement).all())
+
+    def record_fills(self, session: Session, fills: dict[str, str]) -> None:
+        # One UPDATE ... FROM (VALUES ...) for every filled order
+        if not fills:
+            return
+        filled = values(
+            column("order_id", String), column("transaction_code", String), name="fills"
+        ).data(list(fills.items()))
+        statement = (
+            update(Settlement)
+            .where(Settlement.order_id == filled.c.order_id)
+            .values(
+                status=SettlementStatus.SETTLED,
+                transaction_code=filled.c.transaction_code,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        session.execute(statement)
+
+    def mark_orders_failed(self, session: Session, order_ids: list[str]) -> None:
+        if not order_ids:
+            return
+        statement = (
+            update(Settlement)
+            .where(col(Settlement.order_id).in_(order_ids))
+            .values(status=SettlementStatus.FAILED)
+        )
+        session.execute(statement)
+
+    def get_unconfirmed_orders(
+        self, session: Session, in_flight_before: datetime
+    ) -> list[Row[Any]]:
+        # Failed orders, and in-flight ones whose sender apparently died
+        statement = (
+            select(
+                Settlement.order_id,
+                Settlement.market_id,
+                func.sum(Settlement.amount).label("amount"),
+            )
+            .where(
+                or_(
+                    Settlement.status == SettlementStatus.FAILED,
+                    (Settlement.status == SettlementStatus.IN_FLIGHT)
+                    & (col(Settlement.updated_at) < in_flight_before),
+                )
+            )
+            .group_by(Settlement.order_id, Settlement.market_id)
+        )
+        return list(session.execute(statement).all())
+
+    def try_lock_market(self, session: Session, market_id: int) -> bool:
+        statement = select(
+            func.pg_try_advisory_xact_lock(SETTLEMENT_MERGE_LOCK, market_id)
+        )
+        return session.exec(statement).one()
+
     def update_instance(
         self, session: Session,
         settlemet: Settlement,
@@ -128,3 +706,128 @@ class SettlementRepository(abc.ABC):
         settlemet.sqlmodel_update(settlement_data)
         session.add(settlemet)
         return settlemet
+
+
+# Per wallet in one id range: the live balance, the last checkpoint, and the
+# signed DONE ledger sums since that checkpoint and since the new watermark.
+# One statement, so balance and ledger come from the same snapshot.
+RECONCILIATION_PAGE_STATEMENT = text(
+    """
+    SELECT
+        w.id AS wallet_id,
+        w.balance,
+        r.balance AS checkpoint_balance,
+        ledger.since_checkpoint,
+        ledger.since_watermark
+    FROM wallets w
+    LEFT JOIN wallet_reconciliations r ON r.wallet_id = w.id
+    CROSS JOIN LATERAL (
+        SELECT
+            COALESCE(
+                SUM(CASE WHEN t.type = 'DEBT' THEN -t.amount ELSE t.amount END)
+                FILTER (WHERE r.watermark IS NULL OR t.created_at > r.watermark),
+                0
+            ) AS since_checkpoint,
+            COALESCE(
+                SUM(CASE WHEN t.type = 'DEBT' THEN -t.amount ELSE t.amount END)
+                FILTER (WHERE t.created_at > :watermark),
+                0
+            ) AS since_watermark
+        FROM transactions t
+        WHERE t.wallet_id = w.id
+          AND t.status = 'DONE'
+          -- A wallet never checked before has its whole ledger summed
+          AND (r.watermark IS NULL OR t.created_at > LEAST(r.watermark, :watermark))
+    ) ledger
+    WHERE w.id >= :start AND w.id <= :end
+    ORDER BY w.id
+    LIMIT :limit
+    """
+)
+
+
+class ReconciliationRepository:
+    def check_page(
+        self,
+        session: Session,
+        start: uuid.UUID,
+        end: uuid.UUID,
+        watermark: datetime,
+        limit: int,
+    ) -> list[Row[Any]]:
+        params = {"start": start, "end": end, "watermark": watermark, "limit": limit}
+        return list(session.execute(RECONCILIATION_PAGE_STATEMENT, params).all())
+
+    def save_checkpoints(
+        self, session: Session, checkpoints: list[dict[str, Any]]
+    ) -> None:
+        if not checkpoints:
+            return
+        statement = pg_insert(WalletReconciliation).values(checkpoints)
+        statement = statement.on_conflict_do_update(
+            index_elements=[WalletReconciliation.wallet_id],
+            set_={
+                "balance": statement.excluded.balance,
+                "watermark": statement.excluded.watermark,
+                "drift": statement.excluded.drift,
+                "checked_at": statement.excluded.checked_at,
+            },
+        )
+        session.execute(statement)
+
+
+# Advisory lock namespace for the single matching engine writer
+MATCHING_ENGINE_LOCK = 2
+
+# Two int keys are stored as classid, objid with objsubid 2
+WRITER_LOCK_HELD_STATEMENT = text(
+    """
+    SELECT EXISTS (
+        SELECT 1 FROM pg_locks
+        WHERE locktype = 'advisory'
+          AND classid = :key AND objid = 0 AND objsubid = 2
+          AND pid = pg_backend_pid() AND granted
+    )
+    """
+)
+
+
+class OrderBookRepository:
+    def get_snapshots(self, session: Session) -> dict[int, list[dict[str, Any]]]:
+        snapshots = session.exec(select(OrderBookSnapshot)).all()
+        return {snapshot.market_id: snapshot.orders for snapshot in snapshots}
+
+    def save_snapshots(
+        self, session: Session, snapshots: dict[int, list[dict[str, Any]]]
+    ) -> None:
+        if not snapshots:
+            return
+        now = datetime.now(timezone.utc)
+        statement = pg_insert(OrderBookSnapshot).values(
+            [
+                {"market_id": market_id, "orders": orders, "updated_at": now}
+                for market_id, orders in snapshots.items()
+            ]
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[OrderBookSnapshot.market_id],
+            set_={
+                "orders": statement.excluded.orders,
+                "updated_at": statement.excluded.updated_at,
+            },
+        )
+        session.execute(statement)
+
+    def try_lock_writer(self, session: Session) -> bool:
+        # Session level, held for as long as the engine keeps its connection
+        statement = select(func.pg_try_advisory_lock(MATCHING_ENGINE_LOCK, 0))
+        return session.exec(statement).one()
+
+    def holds_writer_lock(self, session: Session) -> bool:
+        """
+        Whether the session's connection still holds the writer lock, it is
+        gone if the connection was dropped and silently replaced.
+        """
+        return session.execute(
+            WRITER_LOCK_HELD_STATEMENT, {"key": MATCHING_ENGINE_LOCK}
+        ).scalar_one()
@@ -0,0 +1,27 @@
+"""purchase_settled_at
+
+Revision ID: 0d5b9e3f7a26
+Revises: f6a1d4c8b257
+Create Date: 2026-10-18 21:14:08.552190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '0d5b9e3f7a26'
+down_revision = 'f6a1d4c8b257'
+branch_labels = None
+depends_on = None
+
+
+# Existing purchases stay NULL: ones whose settlement message is still queued
+# must not be skipped when it arrives
+def upgrade():
+    op.add_column('purchases', sa.Column('settled_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('purchases', 'settled_at')
@@ -0,0 +1,44 @@
+"""market_catalog_notify
+
+Revision ID: 3f9c2d7a41b6
+Revises: 8070eef25a91
+Create Date: 2026-10-18 09:12:40.512318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c2d7a41b6'
+down_revision = '8070eef25a91'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_market_catalog() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('market_catalog', TG_TABLE_NAME);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    for table in ('markets', 'currencies'):
+        op.execute(
+            f"""
+            CREATE TRIGGER {table}_notify_market_catalog
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE PROCEDURE notify_market_catalog()
+            """
+        )
+
+
+def downgrade():
+    for table in ('markets', 'currencies'):
+        op.execute(f'DROP TRIGGER IF EXISTS {table}_notify_market_catalog ON {table}')
+    op.execute('DROP FUNCTION IF EXISTS notify_market_catalog()')
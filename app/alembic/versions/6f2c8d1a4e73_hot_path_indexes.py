@@ -0,0 +1,41 @@
+"""hot_path_indexes
+
+Revision ID: 6f2c8d1a4e73
+Revises: e4b7a19c3d52
+Create Date: 2026-10-18 16:02:11.584903
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '6f2c8d1a4e73'
+down_revision = 'e4b7a19c3d52'
+branch_labels = None
+depends_on = None
+
+
+# settlements(market_id) WHERE active is already served by
+# uq_settlements_market_id_stripe_active, which leads with market_id
+def upgrade():
+    # CONCURRENTLY can't run inside a transaction, and doesn't block writes
+    with op.get_context().autocommit_block():
+        op.create_index('ix_wallets_user_id_currency_id', 'wallets', ['user_id', 'currency_id'], unique=False, postgresql_concurrently=True)
+        op.create_index(op.f('ix_markets_symbol'), 'markets', ['symbol'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_purchases_user_id_created_at', 'purchases', ['user_id', 'created_at'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_transactions_wallet_id_created_at', 'transactions', ['wallet_id', 'created_at'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_settlements_unsettled', 'settlements', ['status', 'updated_at'], unique=False, postgresql_where=sa.text("status IN ('CLOSED', 'IN_FLIGHT', 'FAILED')"), postgresql_concurrently=True)
+        # Fails if duplicate emails exist, drop the invalid index and dedupe first
+        op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f('ix_users_email'), table_name='users', postgresql_concurrently=True)
+        op.drop_index('ix_settlements_unsettled', table_name='settlements', postgresql_concurrently=True)
+        op.drop_index('ix_transactions_wallet_id_created_at', table_name='transactions', postgresql_concurrently=True)
+        op.drop_index('ix_purchases_user_id_created_at', table_name='purchases', postgresql_concurrently=True)
+        op.drop_index(op.f('ix_markets_symbol'), table_name='markets', postgresql_concurrently=True)
+        op.drop_index('ix_wallets_user_id_currency_id', table_name='wallets', postgresql_concurrently=True)
@@ -0,0 +1,39 @@
+"""settlement_stripes
+
+Revision ID: 9a4f1b2e7d35
+Revises: 5d0a7e3b6c18
+Create Date: 2026-10-18 12:41:05.663920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4f1b2e7d35'
+down_revision = '5d0a7e3b6c18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('settlements', sa.Column('stripe', sa.Integer(), server_default='0', nullable=False))
+    # Concurrent creates could leave several active rows per market, keep
+    # them all as separate stripes so the unique index can be built
+    op.execute(
+        """
+        UPDATE settlements SET stripe = numbered.stripe
+        FROM (
+            SELECT id, row_number() OVER (PARTITION BY market_id ORDER BY id) - 1 AS stripe
+            FROM settlements WHERE active
+        ) AS numbered
+        WHERE settlements.id = numbered.id
+        """
+    )
+    op.create_index('uq_settlements_market_id_stripe_active', 'settlements', ['market_id', 'stripe'], unique=True, postgresql_where=sa.text('active'))
+
+
+def downgrade():
+    op.drop_index('uq_settlements_market_id_stripe_active', table_name='settlements', postgresql_where=sa.text('active'))
+    op.drop_column('settlements', 'stripe')
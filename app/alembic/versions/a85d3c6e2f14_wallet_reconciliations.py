@@ -0,0 +1,33 @@
+"""wallet_reconciliations
+
+Revision ID: a85d3c6e2f14
+Revises: 6f2c8d1a4e73
+Create Date: 2026-10-18 16:47:29.716350
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'a85d3c6e2f14'
+down_revision = '6f2c8d1a4e73'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('wallet_reconciliations',
+    sa.Column('wallet_id', sa.Uuid(), nullable=False),
+    sa.Column('balance', sa.Numeric(precision=16, scale=6), nullable=False),
+    sa.Column('watermark', sa.DateTime(), nullable=False),
+    sa.Column('drift', sa.Numeric(precision=16, scale=6), nullable=False),
+    sa.Column('checked_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['wallet_id'], ['wallets.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('wallet_id')
+    )
+
+
+def downgrade():
+    op.drop_table('wallet_reconciliations')
@@ -0,0 +1,27 @@
+"""pending_purchases_index
+
+Revision ID: b8e4f2a6c391
+Revises: d3e91b7c5a08
+Create Date: 2026-10-18 19:41:27.302618
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e4f2a6c391'
+down_revision = 'd3e91b7c5a08'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_purchases_pending', 'purchases', ['created_at'], unique=False, postgresql_where=sa.text("status = 'PENDING'"), postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_purchases_pending', table_name='purchases', postgresql_concurrently=True)
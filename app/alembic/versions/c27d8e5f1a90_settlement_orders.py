@@ -0,0 +1,35 @@
+"""settlement_orders
+
+Revision ID: c27d8e5f1a90
+Revises: 9a4f1b2e7d35
+Create Date: 2026-10-18 14:08:33.105276
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'c27d8e5f1a90'
+down_revision = '9a4f1b2e7d35'
+branch_labels = None
+depends_on = None
+
+settlement_status = sa.Enum('OPEN', 'IN_FLIGHT', 'SETTLED', 'FAILED', name='settlementstatus')
+
+
+def upgrade():
+    settlement_status.create(op.get_bind())
+    op.add_column('settlements', sa.Column('order_id', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    op.add_column('settlements', sa.Column('status', settlement_status, server_default='OPEN', nullable=False))
+    # Closed settlements were sent to the exchange synchronously until now
+    op.execute("UPDATE settlements SET status = 'SETTLED' WHERE NOT active")
+    op.create_index(op.f('ix_settlements_order_id'), 'settlements', ['order_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_settlements_order_id'), table_name='settlements')
+    op.drop_column('settlements', 'status')
+    op.drop_column('settlements', 'order_id')
+    settlement_status.drop(op.get_bind())
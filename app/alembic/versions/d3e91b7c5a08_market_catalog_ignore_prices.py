@@ -0,0 +1,43 @@
+"""market_catalog_ignore_prices
+
+Revision ID: d3e91b7c5a08
+Revises: a85d3c6e2f14
+Create Date: 2026-10-18 17:25:03.281947
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3e91b7c5a08'
+down_revision = 'a85d3c6e2f14'
+branch_labels = None
+depends_on = None
+
+
+# The price feed writes prices every second and announces them itself, so
+# those updates must not reload every market catalog
+def upgrade():
+    op.execute('DROP TRIGGER IF EXISTS markets_notify_market_catalog ON markets')
+    op.execute(
+        """
+        CREATE TRIGGER markets_notify_market_catalog
+        AFTER INSERT
+            OR UPDATE OF name, symbol, active, base_currency_id, qoute_currency_id
+            OR DELETE OR TRUNCATE ON markets
+        FOR EACH STATEMENT EXECUTE PROCEDURE notify_market_catalog()
+        """
+    )
+
+
+def downgrade():
+    op.execute('DROP TRIGGER IF EXISTS markets_notify_market_catalog ON markets')
+    op.execute(
+        """
+        CREATE TRIGGER markets_notify_market_catalog
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON markets
+        FOR EACH STATEMENT EXECUTE PROCEDURE notify_market_catalog()
+        """
+    )
@@ -0,0 +1,26 @@
+"""settlement_closed_status
+
+Revision ID: e4b7a19c3d52
+Revises: c27d8e5f1a90
+Create Date: 2026-10-18 15:21:47.392815
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b7a19c3d52'
+down_revision = 'c27d8e5f1a90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("ALTER TYPE settlementstatus ADD VALUE IF NOT EXISTS 'CLOSED' AFTER 'OPEN'")
+
+
+def downgrade():
+    # Enum values can't be dropped, send any waiting orders through the resend path
+    op.execute("UPDATE settlements SET status = 'FAILED' WHERE status = 'CLOSED'")
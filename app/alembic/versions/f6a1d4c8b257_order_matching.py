@@ -0,0 +1,37 @@
+"""order_matching
+
+Revision ID: f6a1d4c8b257
+Revises: b8e4f2a6c391
+Create Date: 2026-10-18 20:26:53.418072
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'f6a1d4c8b257'
+down_revision = 'b8e4f2a6c391'
+branch_labels = None
+depends_on = None
+
+order_side = sa.Enum('BUY', 'SELL', name='orderside')
+
+
+def upgrade():
+    order_side.create(op.get_bind())
+    op.add_column('settlement_outbox', sa.Column('side', order_side, server_default='BUY', nullable=False))
+    op.create_table('order_book_snapshots',
+    sa.Column('market_id', sa.Integer(), nullable=False),
+    sa.Column('orders', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['market_id'], ['markets.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('market_id')
+    )
+
+
+def downgrade():
+    op.drop_table('order_book_snapshots')
+    op.drop_column('settlement_outbox', 'side')
+    order_side.drop(op.get_bind())
@@ -1,18 +1,26 @@
-from collections.abc import Generator
+import time
+from collections.abc import AsyncGenerator, Generator
 from typing import Annotated
+from uuid import UUID
 
 import jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from pydantic import ValidationError
+from sqlalchemy import Engine, func
+from sqlalchemy.orm import make_transient_to_detached
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app.adapters.notify import NotificationListener
 from app.core import security
+from app.core.cache import TTLCache
 from app.core.config import settings
-from app.core.db import engine
+from app.core.db import async_engine, engine
+from app.core.replica import read_router
 from app.models import TokenPayload, User
-from app.service.purchase_service import PurchaseService
+from app.service.purchase_service import AsyncPurchaseService, PurchaseService
 
 reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/login/access-token"
@@ -24,22 +32,98 @@ def get_db() -> Generator[Session, None, None]:
         yield session
 
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    # Objects must stay readable after commit without an implicit (sync) reload
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+
+# Verified token -> user id, and user id -> detached snapshot of the user row
+token_cache: TTLCache[str, str] = TTLCache(
+    settings.PRINCIPAL_CACHE_MAX_SIZE, settings.PRINCIPAL_CACHE_TTL_SECONDS
+)
+user_cache: TTLCache[str, User] = TTLCache(
+    settings.PRINCIPAL_CACHE_MAX_SIZE, settings.PRINCIPAL_CACHE_TTL_SECONDS
+)
+
+
+def get_read_db(request: Request) -> Generator[Session, None, None]:
+    """
+    Session for read-only routes, on a replica unless replicas lag or the
+    client has just written. Never write through it.
+    """
+    read_engine = read_router.engine_for(request.headers.get("Authorization"))
+    with Session(read_engine) as session:
+        yield session
+
+
 SessionDep = Annotated[Session, Depends(get_db)]
+ReadSessionDep = Annotated[Session, Depends(get_read_db)]
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_db)]
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
 
 
-def get_current_user(session: SessionDep, token: TokenDep) -> User:
+def decode_token(token: str) -> TokenPayload:
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
         )
-        token_data = TokenPayload(**payload)
+        return TokenPayload(**payload)
     except (InvalidTokenError, ValidationError):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    user = session.get(User, token_data.sub)
+
+
+def verify_token(token: str) -> str:
+    user_id = token_cache.get(token)
+    if user_id is None:
+        token_data = decode_token(token)
+        if token_data.sub is None:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Could not validate credentials",
+            )
+        user_id = token_data.sub
+        expires_at = None
+        if token_data.exp is not None:
+            expires_at = time.monotonic() + token_data.exp - time.time()
+        token_cache.set(token, user_id, expires_at)
+    return user_id
+
+
+def cache_user(user: User) -> None:
+    # A detached copy, so no session ever shares or mutates the cached object
+    snapshot = User(**user.model_dump())
+    make_transient_to_detached(snapshot)
+    user_cache.set(str(user.id), snapshot)
+
+
+# Evictions from user_cache, broadcast to every API process
+USER_INVALIDATION_CHANNEL = "user_invalidations"
+
+
+def invalidate_user(session: Session, user_id: UUID) -> None:
+    """
+    Drops the cached principal here and, through NOTIFY, in every other
+    process. Call it after the change to the user is committed.
+    """
+    user_cache.pop(str(user_id))
+    session.execute(select(func.pg_notify(USER_INVALIDATION_CHANNEL, str(user_id))))
+    session.commit()
+
+
+def user_invalidation_listener(engine: Engine) -> NotificationListener:
+    return NotificationListener(
+        engine.url.set(drivername="postgresql").render_as_string(hide_password=False),
+        {USER_INVALIDATION_CHANNEL: user_cache.pop},
+        # Invalidations may have been missed while disconnected
+        on_connect=user_cache.clear,
+    )
+
+
+def check_user(user: User | None) -> User:
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if not user.is_active:
@@ -47,7 +131,27 @@ def get_current_user(session: SessionDep, token: TokenDep) -> User:
     return user
 
 
+def get_current_user(session: SessionDep, token: TokenDep) -> User:
+    user_id = verify_token(token)
+    if cached := user_cache.get(user_id):
+        # Attaches a copy to the session without a SELECT
+        return session.merge(cached, load=False)
+    user = check_user(session.get(User, user_id))
+    cache_user(user)
+    return user
+
+
+async def get_current_user_async(session: AsyncSessionDep, token: TokenDep) -> User:
+    user_id = verify_token(token)
+    if cached := user_cache.get(user_id):
+        return await session.merge(cached, load=False)
+    user = check_user(await session.get(User, user_id))
+    cache_user(user)
+    return user
+
+
 CurrentUser = Annotated[User, Depends(get_current_user)]
+AsyncCurrentUser = Annotated[User, Depends(get_current_user_async)]
 
 
 def get_current_active_superuser(current_user: CurrentUser) -> User:
@@ -58,5 +162,15 @@ def get_current_active_superuser(current_user: CurrentUser) -> User:
     return current_user
 
 
+def get_current_active_superuser_async(current_user: AsyncCurrentUser) -> User:
+    return get_current_active_superuser(current_user)
+
+
 def get_purchase_service(db_session: Session = Depends(get_db), user: User = Depends(get_current_user)):
     return PurchaseService(db_session, user)
+
+
+def get_async_purchase_service(
+    db_session: AsyncSessionDep, user: AsyncCurrentUser
+) -> AsyncPurchaseService:
+    return AsyncPurchaseService(db_session, user)
@@ -1,9 +1,11 @@
 from fastapi import APIRouter
 
-from app.api.routes import login, users, utils, purchase
+from app.api.routes import events, exports, login, users, utils, purchase
 
 api_router = APIRouter()
 api_router.include_router(login.router, tags=["login"])
 api_router.include_router(users.router, prefix="/users", tags=["users"])
 api_router.include_router(utils.router, prefix="/utils", tags=["utils"])
 api_router.include_router(purchase.router, prefix="/purchases", tags=["purchase"])
+api_router.include_router(exports.router, prefix="/exports", tags=["exports"])
+api_router.include_router(events.router, prefix="/events", tags=["events"])
@@ -0,0 +1,49 @@
+import base64
+import binascii
+import json
+from typing import Any
+
+from fastapi import HTTPException
+from sqlalchemy import func, text
+from sqlmodel import Session, SQLModel, select
+
+
+def encode_cursor(*values: Any) -> str:
+    """
+    Opaque keyset cursor holding the sort key of the last row of a page.
+    """
+    raw = json.dumps([str(value) for value in values]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list[str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        values = None
+    # encode_cursor only writes strings, anything else was tampered with
+    if (
+        not isinstance(values, list)
+        or len(values) != size
+        or not all(isinstance(value, str) for value in values)
+    ):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def approximate_count(session: Session, model: type[SQLModel]) -> int:
+    """
+    Row count estimate kept by VACUUM/ANALYZE, free to read however large
+    the table. Falls back to an exact count for tables never analyzed.
+    """
+    statement = text(
+        "SELECT reltuples::bigint AS estimate, relpages FROM pg_class "
+        "WHERE oid = to_regclass(quote_ident(:table))"
+    )
+    row = session.execute(statement, {"table": model.__tablename__}).first()
+    # Never analyzed reads -1 since PG 14 but 0 before it, an empty estimate
+    # is cheap to replace with an exact count either way
+    if row is None or row.estimate <= 0 or row.relpages == 0:
+        return session.exec(select(func.count()).select_from(model)).one()
+    return row.estimate
@@ -0,0 +1,64 @@
+import asyncio
+import json
+from collections.abc import AsyncGenerator
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from app.adapters import event_broker, market_catalog
+from app.adapters.events import PURCHASE_EVENTS_CHANNEL, Subscription
+from app.api.deps import AsyncCurrentUser
+from app.core.config import settings
+
+router = APIRouter()
+
+
+async def stream_events(
+    request: Request, subscription: Subscription
+) -> AsyncGenerator[str, None]:
+    try:
+        while not await request.is_disconnected():
+            try:
+                item = await asyncio.wait_for(
+                    subscription.queue.get(), settings.EVENTS_HEARTBEAT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing an idle connection
+                yield ": keepalive\n\n"
+                continue
+            if item is None:
+                # Dropped for falling behind, the client reconnects
+                return
+            channel, event = item
+            name = "purchase" if channel == PURCHASE_EVENTS_CHANNEL else "settlement"
+            yield f"event: {name}\ndata: {json.dumps(event)}\n\n"
+    finally:
+        event_broker.unsubscribe(subscription)
+
+
+@router.get("/stream")
+async def stream(
+    request: Request,
+    current_user: AsyncCurrentUser,
+    markets: list[str] | None = Query(default=None),
+) -> StreamingResponse:
+    """
+    Stream status changes of own purchases and of settlements as server-sent
+    events. Settlements can be limited to the given market symbols.
+    """
+    market_ids = None
+    if markets:
+        market_ids = set()
+        for symbol in markets:
+            market = market_catalog.get_by_symbol(symbol)
+            if not market:
+                raise HTTPException(
+                    status_code=404, detail=f"Market {symbol} not found"
+                )
+            market_ids.add(market.id)
+    subscription = event_broker.subscribe(current_user.id, market_ids)
+    return StreamingResponse(
+        stream_events(request, subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,53 @@
+import uuid
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from app.adapters import LedgerFilter, LedgerFormat, LedgerTable, stream_ledger
+from app.api.deps import get_current_active_superuser
+from app.core.config import settings
+from app.core.replica import read_router
+
+router = APIRouter()
+
+MEDIA_TYPES = {"csv": "text/csv", "arrow": "application/vnd.apache.arrow.stream"}
+
+
+@router.get("/{table}", dependencies=[Depends(get_current_active_superuser)])
+def export_ledger(
+    request: Request,
+    table: LedgerTable,
+    format: LedgerFormat = "csv",
+    since: datetime | None = None,
+    until: datetime | None = None,
+    user_id: uuid.UUID | None = None,
+    after_created_at: datetime | None = None,
+    after_id: uuid.UUID | None = None,
+) -> StreamingResponse:
+    """
+    Stream a full ledger table, ordered by (created_at, id). To resume an
+    interrupted export pass the created_at and id of the last row received.
+    """
+    if (after_created_at is None) != (after_id is None):
+        raise HTTPException(
+            status_code=422, detail="after_created_at and after_id go together"
+        )
+    filters = LedgerFilter(
+        since=since,
+        until=until,
+        user_id=user_id,
+        after_created_at=after_created_at,
+        after_id=after_id,
+    )
+    # Long running reads belong on a replica whenever one is usable
+    read_engine = read_router.engine_for(request.headers.get("Authorization"))
+    chunks = stream_ledger(
+        read_engine, table, format, filters, settings.LEDGER_EXPORT_CHUNK_SIZE
+    )
+    extension = "arrows" if format == "arrow" else "csv"
+    return StreamingResponse(
+        chunks,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{table}.{extension}"'},
+    )
@@ -1,32 +1,174 @@
 import uuid
-from typing import Any
+from collections.abc import Generator
+from datetime import datetime
+from typing import Annotated, Any
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import col, delete, func, select
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+)
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Engine
+from sqlmodel import Session, col, delete, func, select
 
 from app import crud
-from app.api.deps import SessionDep, get_current_active_superuser, get_purchase_service
+from app.api.deps import (
+    AsyncSessionDep,
+    CurrentUser,
+    ReadSessionDep,
+    SessionDep,
+    get_async_purchase_service,
+    get_current_active_superuser,
+    get_current_active_superuser_async,
+    get_purchase_service,
+)
+from app.adapters import PurchaseRepository, market_catalog
+from app.api.pagination import decode_cursor, encode_cursor
 from app.core.config import settings
-from app.models import Purchase, Market, PurchaseRequest
-from app.service import PurchaseService
+from app.core.replica import read_router
+from app.models import (
+    Purchase,
+    Market,
+    PurchaseRequest,
+    PurchaseBatchResult,
+    PurchasePublic,
+    PurchasesPublic,
+    PurchaseStatus,
+)
+from app.service import AsyncPurchaseService, PurchaseService
 
 router = APIRouter()
 
 
-@router.post("/", dependencies=[Depends(get_current_active_superuser)])
-def create_purchase(
+@router.get("/", response_model=PurchasesPublic)
+def read_purchases(
+    session: ReadSessionDep,
+    current_user: CurrentUser,
+    limit: Annotated[int, Query(ge=1, le=settings.PURCHASE_PAGE_MAX_SIZE)] = 100,
+    cursor: str | None = None,
+) -> Any:
+    """
+    Retrieve own purchases, newest first. Pass the returned `next_cursor` as
+    `cursor` to get the next page.
+    """
+    before = None
+    if cursor:
+        created_at, purchase_id = decode_cursor(cursor, 2)
+        try:
+            before = (datetime.fromisoformat(created_at), uuid.UUID(purchase_id))
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    rows = PurchaseRepository().get_history_page(
+        session, current_user.id, limit, before
+    )
+    next_cursor = None
+    if len(rows) == limit:
+        next_cursor = encode_cursor(rows[-1].created_at.isoformat(), rows[-1].id)
+    return PurchasesPublic(
+        data=[PurchasePublic.model_validate(row._asdict()) for row in rows],
+        next_cursor=next_cursor,
+    )
+
+
+def stream_purchases(
+    read_engine: Engine, user_id: uuid.UUID
+) -> Generator[bytes, None, None]:
+    # Owns its session, request dependencies are closed before the body is sent
+    with Session(read_engine) as session:
+        rows = PurchaseRepository().stream_history(
+            session, user_id, settings.PURCHASE_STREAM_CHUNK_SIZE
+        )
+        for row in rows:
+            purchase = PurchasePublic.model_validate(row._asdict())
+            yield purchase.model_dump_json().encode() + b"\n"
+
+
+@router.get("/stream")
+def stream_purchase_history(
+    request: Request, current_user: CurrentUser
+) -> StreamingResponse:
+    """
+    Stream all own purchases, newest first, as newline delimited JSON.
+    """
+    read_engine = read_router.engine_for(request.headers.get("Authorization"))
+    return StreamingResponse(
+        stream_purchases(read_engine, current_user.id),
+        media_type="application/x-ndjson",
+    )
+
+
+@router.post("/", dependencies=[Depends(get_current_active_superuser_async)])
+async def create_purchase(
     *,
-    session: SessionDep,
+    session: AsyncSessionDep,
+    response: Response,
     purchase_request: PurchaseRequest,
-    purchase_service: PurchaseService = Depends(get_purchase_service),
+    purchase_service: AsyncPurchaseService = Depends(get_async_purchase_service),
+    idempotency_key: Annotated[str | None, Header(max_length=255)] = None,
 ) -> Any:
     """
     Make a new purchase.
+
+    Retries sending the same Idempotency-Key get the original purchase back.
+    In queued mode the purchase is accepted as PENDING with a 202 and
+    completed in the background.
     """
-    market = session.exec(
-        select(Market).where(Market.symbol == purchase_request.market)
-    ).first()
+    market = (
+        market_catalog.get_by_symbol(purchase_request.market)
+        or (
+            await session.exec(
+                select(Market).where(Market.symbol == purchase_request.market)
+            )
+        ).first()
+    )
     if not market:
         raise HTTPException(status_code=404, detail="Market ID not found")
-    purchase = purchase_service.purchase(market, purchase_request.amount)
+    purchase = await purchase_service.purchase(
+        market, purchase_request.amount, idempotency_key
+    )
+    if purchase.status == PurchaseStatus.PENDING:
+        response.status_code = 202
     return purchase
+
+
+@router.post(
+    "/batch",
+    dependencies=[Depends(get_current_active_superuser)],
+    response_model=PurchaseBatchResult,
+)
+def create_purchase_batch(
+    *,
+    session: SessionDep,
+    purchase_requests: list[PurchaseRequest],
+    purchase_service: PurchaseService = Depends(get_purchase_service),
+) -> Any:
+    """
+    Make many purchases in one transaction.
+    """
+    if not purchase_requests:
+        raise HTTPException(status_code=422, detail="Batch is empty")
+    if len(purchase_requests) > settings.PURCHASE_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch is limited to {settings.PURCHASE_BATCH_MAX_SIZE} purchases",
+        )
+    symbols = {purchase_request.market for purchase_request in purchase_requests}
+    markets = {
+        symbol: market
+        for symbol in symbols
+        if (market := market_catalog.get_by_symbol(symbol))
+    }
+    if missing := symbols - markets.keys():
+        markets.update(
+            (market.symbol, market)
+            for market in session.exec(
+                select(Market).where(col(Market.symbol).in_(missing))
+            )
+        )
+    results = purchase_service.purchase_batch(purchase_requests, markets)
+    return PurchaseBatchResult(data=results, count=len(results))
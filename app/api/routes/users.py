@@ -6,10 +6,14 @@ from sqlmodel import col, delete, func, select
 
 from app import crud
 from app.api.deps import (
+    AsyncCurrentUser,
     CurrentUser,
+    ReadSessionDep,
     SessionDep,
     get_current_active_superuser,
+    invalidate_user,
 )
+from app.api.pagination import approximate_count, decode_cursor, encode_cursor
 from app.core.config import settings
 from app.core.security import get_password_hash, verify_password
 from app.models import (
@@ -32,18 +36,40 @@ router = APIRouter()
     dependencies=[Depends(get_current_active_superuser)],
     response_model=UsersPublic,
 )
-def read_users(session: SessionDep, skip: int = 0, limit: int = 100) -> Any:
+def read_users(
+    session: ReadSessionDep,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    exact_count: bool = False,
+) -> Any:
     """
     Retrieve users.
-    """
 
-    count_statement = select(func.count()).select_from(User)
-    count = session.exec(count_statement).one()
-
-    statement = select(User).offset(skip).limit(limit)
+    Pass the returned `next_cursor` as `cursor` to get the next page, `skip`
+    is only kept for old clients. `count` is an estimate unless
+    `exact_count` is set.
+    """
+
+    if exact_count:
+        count_statement = select(func.count()).select_from(User)
+        count = session.exec(count_statement).one()
+    else:
+        count = approximate_count(session, User)
+
+    statement = select(User).order_by(col(User.id)).limit(limit)
+    if cursor:
+        (last_id,) = decode_cursor(cursor, 1)
+        try:
+            statement = statement.where(col(User.id) > uuid.UUID(last_id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    elif skip:
+        statement = statement.offset(skip)
     users = session.exec(statement).all()
 
-    return UsersPublic(data=users, count=count)
+    next_cursor = encode_cursor(users[-1].id) if len(users) == limit else None
+    return UsersPublic(data=users, count=count, next_cursor=next_cursor)
 
 
 @router.post(
@@ -82,6 +108,7 @@ def update_user_me(
     current_user.sqlmodel_update(user_data)
     session.add(current_user)
     session.commit()
+    invalidate_user(session, current_user.id)
     session.refresh(current_user)
     return current_user
 
@@ -103,11 +130,12 @@ def update_password_me(
     current_user.hashed_password = hashed_password
     session.add(current_user)
     session.commit()
+    invalidate_user(session, current_user.id)
     return Message(message="Password updated successfully")
 
 
 @router.get("/me", response_model=UserPublic)
-def read_user_me(current_user: CurrentUser) -> Any:
+async def read_user_me(current_user: AsyncCurrentUser) -> Any:
     """
     Get current user.
     """
@@ -124,8 +152,10 @@ def delete_user_me(session: SessionDep, current_user: CurrentUser) -> Any:
             status_code=403, detail="Super users are not allowed to delete themselves"
         )
 
+    user_id = current_user.id
     session.delete(current_user)
     session.commit()
+    invalidate_user(session, user_id)
     return Message(message="User deleted successfully")
 
 
@@ -147,13 +177,14 @@ def register_user(session: SessionDep, user_in: UserRegister) -> Any:
 
 @router.get("/{user_id}", response_model=UserPublic)
 def read_user_by_id(
-    user_id: uuid.UUID, session: SessionDep, current_user: CurrentUser
+    user_id: uuid.UUID, session: ReadSessionDep, current_user: CurrentUser
 ) -> Any:
     """
     Get a specific user by id.
     """
     user = session.get(User, user_id)
-    if user == current_user:
+    # Loaded through a different session than current_user, compare ids
+    if user and user.id == current_user.id:
         return user
     if not current_user.is_superuser:
         raise HTTPException(
@@ -192,6 +223,7 @@ def update_user(
             )
 
     db_user = crud.update_user(session=session, db_user=db_user, user_in=user_in)
+    invalidate_user(session, user_id)
     return db_user
 
 
@@ -212,4 +244,5 @@ def delete_user(
 
     session.delete(user)
     session.commit()
+    invalidate_user(session, user_id)
     return Message(message="User deleted successfully")
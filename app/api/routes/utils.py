@@ -1,6 +1,35 @@
-from fastapi import APIRouter
+from typing import Any
+
+from fastapi import APIRouter, Depends
+
+from app.api.deps import get_current_active_superuser_async
+from app.core.db import async_engine, engine, pool_status
+from app.core.metrics import metrics
+
 router = APIRouter()
 
 @router.get("/health-check/")
 async def health_check() -> bool:
     return True
+
+
+@router.get("/db-pool/", dependencies=[Depends(get_current_active_superuser_async)])
+async def db_pool() -> dict[str, Any]:
+    """
+    Connection pool usage of this API process, with checkout wait times and
+    timeouts since it started.
+    """
+    timings = metrics.snapshot()
+    return {
+        "engines": {"api": pool_status(engine), "api_async": pool_status(async_engine)},
+        "wait": {
+            name: timing
+            for name, timing in timings["timings"].items()
+            if name.startswith("db.pool.")
+        },
+        "timeouts": {
+            name: count
+            for name, count in timings["counters"].items()
+            if name.startswith("db.pool.")
+        },
+    }
@@ -1,10 +1,180 @@
+import time
+from logging import getLogger
+from typing import Any
+
+from sqlalchemy import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, Pool, QueuePool
 from sqlmodel import Session, create_engine, select
 
-from app.adapters import WalletRepository, CurrencyRepository, MarketRepository
+from app.adapters import (
+    CurrencyRepository,
+    MarketRepository,
+    TransactionRepository,
+    WalletRepository,
+)
 from app.core.config import settings
-from app.models import User, UserCreate, Wallet, Market, Currency
+from app.core.metrics import metrics
+from app.models import (
+    Currency,
+    Market,
+    Transaction,
+    TransactionStatus,
+    TransactionType,
+    User,
+    UserCreate,
+    Wallet,
+)
 from app import crud
-engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+
+logger = getLogger(__name__)
+
+
+class TimedPoolMixin:
+    """
+    Records how long checkouts wait for a connection and how often they
+    time out, under db.pool.<name>.
+    """
+
+    metrics_name = "db"
+
+    def _do_get(self) -> Any:
+        start = time.perf_counter()
+        try:
+            return super()._do_get()  # type: ignore[misc]
+        except PoolTimeoutError:
+            metrics.incr(f"db.pool.{self.metrics_name}.timeouts")
+            raise
+        finally:
+            metrics.observe(
+                f"db.pool.{self.metrics_name}.wait", time.perf_counter() - start
+            )
+
+    def recreate(self) -> Pool:
+        pool = super().recreate()  # type: ignore[misc]
+        pool.metrics_name = self.metrics_name
+        return pool
+
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def connect_args(lock_timeout_ms: int, statement_timeout_ms: int) -> dict[str, Any]:
+    if settings.DB_PGBOUNCER:
+        # Startup options don't pass PgBouncer, the role has to carry them
+        logger.warning(
+            "DB_PGBOUNCER is on, lock_timeout=%sms and statement_timeout=%sms "
+            "are not sent and must be set on the database role",
+            lock_timeout_ms,
+            statement_timeout_ms,
+        )
+        return {"prepare_threshold": None}
+    options = f"-c lock_timeout={lock_timeout_ms}"
+    if statement_timeout_ms:
+        options += f" -c statement_timeout={statement_timeout_ms}"
+    return {"options": options}
+
+
+def pool_args(
+    pool_class: type[Pool], pool_size: int, max_overflow: int
+) -> dict[str, Any]:
+    if settings.DB_PGBOUNCER:
+        return {"poolclass": NullPool}
+    return {
+        "poolclass": pool_class,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+    }
+
+
+def name_pool(pool: Pool, name: str) -> None:
+    if isinstance(pool, TimedPoolMixin):
+        pool.metrics_name = name
+
+
+def create_db_engine(
+    pool_size: int,
+    max_overflow: int,
+    lock_timeout_ms: int,
+    statement_timeout_ms: int = 0,
+    name: str = "db",
+    url: str | None = None,
+) -> Engine:
+    db_engine = create_engine(
+        url or str(settings.SQLALCHEMY_DATABASE_URI),
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args=connect_args(lock_timeout_ms, statement_timeout_ms),
+        **pool_args(TimedQueuePool, pool_size, max_overflow),
+    )
+    name_pool(db_engine.pool, name)
+    return db_engine
+
+
+def create_async_db_engine(
+    pool_size: int,
+    max_overflow: int,
+    lock_timeout_ms: int,
+    statement_timeout_ms: int = 0,
+    name: str = "db",
+) -> AsyncEngine:
+    # psycopg 3 speaks asyncio natively, so the same URL drives the async engine
+    db_engine = create_async_engine(
+        str(settings.SQLALCHEMY_DATABASE_URI),
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args=connect_args(lock_timeout_ms, statement_timeout_ms),
+        **pool_args(TimedAsyncQueuePool, pool_size, max_overflow),
+    )
+    name_pool(db_engine.pool, name)
+    return db_engine
+
+
+def pool_status(db_engine: Engine | AsyncEngine) -> dict[str, Any]:
+    pool = db_engine.pool
+    status: dict[str, Any] = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            idle=pool.checkedin(),
+            # overflow() counts down from -size until the pool is full
+            overflow=max(pool.overflow(), 0),
+        )
+    return status
+
+
+engine = create_db_engine(
+    settings.DB_POOL_SIZE,
+    settings.DB_MAX_OVERFLOW,
+    settings.DB_LOCK_TIMEOUT_MS,
+    settings.DB_STATEMENT_TIMEOUT_MS,
+    name="api",
+)
+async_engine = create_async_db_engine(
+    settings.DB_POOL_SIZE,
+    settings.DB_MAX_OVERFLOW,
+    settings.DB_LOCK_TIMEOUT_MS,
+    settings.DB_STATEMENT_TIMEOUT_MS,
+    name="api_async",
+)
+replica_engines = [
+    create_db_engine(
+        settings.DB_POOL_SIZE,
+        settings.DB_MAX_OVERFLOW,
+        settings.DB_LOCK_TIMEOUT_MS,
+        settings.DB_STATEMENT_TIMEOUT_MS,
+        name=f"replica_{index}",
+        url=str(uri),
+    )
+    for index, uri in enumerate(settings.SQLALCHEMY_REPLICA_URIS)
+]
 
 
 # make sure all SQLModel models are imported (app.models) before initializing DB
@@ -12,6 +182,20 @@ engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
 # for more details: https://github.com/fastapi/full-stack-fastapi-template/issues/28
 
 
+def fund_wallet(session: Session, wallet: Wallet) -> None:
+    # Seed funds go through the ledger so reconciliation can account for them
+    TransactionRepository().new(
+        session,
+        Transaction(
+            amount=wallet.balance,
+            status=TransactionStatus.DONE,
+            type=TransactionType.CREDIT,
+            wallet_id=wallet.id,
+        ),
+    )
+    session.commit()
+
+
 def init_db(session: Session) -> None:
     # Tables should be created with Alembic migrations
     # But if you don't want to use migrations, create
@@ -66,6 +250,7 @@ def init_db(session: Session) -> None:
             user_id=user.id
         )
         base_wallet = WalletRepository().create(session=session, wallet=base_wallet_in)
+        fund_wallet(session, base_wallet)
 
 
     qoute_wallet = session.exec(
@@ -80,6 +265,7 @@ def init_db(session: Session) -> None:
             user_id=user.id
         )
         qoute_wallet = WalletRepository().create(session=session, wallet=qoute_wallet_in)
+        fund_wallet(session, qoute_wallet)
 
     market = session.exec(
         select(Market).where(Market.base_currency_id == base_currency.id)
@@ -0,0 +1,108 @@
+import hashlib
+import math
+import random
+import threading
+import time
+from logging import getLogger
+
+from sqlalchemy import Engine, text
+from sqlalchemy.exc import DBAPIError
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.db import engine, replica_engines
+from app.core.metrics import metrics
+
+logger = getLogger(__name__)
+
+# Zero while the replica has replayed everything it received, so an idle
+# primary doesn't look like lag
+REPLICA_LAG_STATEMENT = text(
+    """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(
+            EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0
+        )
+    END
+    """
+)
+
+
+class ReadRouter:
+    """
+    Picks the engine for read-only sessions: a random replica whose lag is
+    under `max_lag`, or the primary when there is none, or when the client
+    wrote within the last `sticky_seconds`.
+
+    Writers are remembered per process, so a client whose next read lands on
+    another API worker relies on the lag bound alone.
+    """
+
+    def __init__(
+        self,
+        primary: Engine,
+        replicas: list[Engine],
+        max_lag: float,
+        lag_check_interval: float,
+        sticky_seconds: float,
+    ) -> None:
+        self.primary = primary
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.lag_check_interval = lag_check_interval
+        self._lock = threading.Lock()
+        # replica -> (checked_at, lag)
+        self._lags: dict[Engine, tuple[float, float]] = {}
+        self._writers: TTLCache[str, bool] = TTLCache(
+            settings.PRINCIPAL_CACHE_MAX_SIZE, sticky_seconds
+        )
+
+    @staticmethod
+    def principal_key(authorization: str) -> str:
+        return hashlib.sha256(authorization.encode()).hexdigest()
+
+    def mark_write(self, authorization: str) -> None:
+        if self.replicas:
+            self._writers.set(self.principal_key(authorization), True)
+
+    def engine_for(self, authorization: str | None) -> Engine:
+        if not self.replicas:
+            return self.primary
+        if authorization and self._writers.get(self.principal_key(authorization)):
+            metrics.incr("db.read.sticky_primary")
+            return self.primary
+        healthy = [
+            replica for replica in self.replicas if self.lag(replica) <= self.max_lag
+        ]
+        if not healthy:
+            metrics.incr("db.read.replica_fallback")
+            return self.primary
+        return random.choice(healthy)
+
+    def lag(self, replica: Engine) -> float:
+        now = time.monotonic()
+        with self._lock:
+            checked = self._lags.get(replica)
+            if checked and now - checked[0] < self.lag_check_interval:
+                return checked[1]
+            # Other threads keep using the old value while this one measures
+            self._lags[replica] = (now, checked[1] if checked else math.inf)
+        try:
+            with replica.connect() as connection:
+                lag = float(connection.execute(REPLICA_LAG_STATEMENT).scalar() or 0)
+        except DBAPIError:
+            logger.warning("Replica %s is unreachable", replica.url.host, exc_info=True)
+            lag = math.inf
+        with self._lock:
+            self._lags[replica] = (time.monotonic(), lag)
+        return lag
+
+
+read_router = ReadRouter(
+    engine,
+    replica_engines,
+    max_lag=settings.REPLICA_MAX_LAG_SECONDS,
+    lag_check_interval=settings.REPLICA_LAG_CHECK_INTERVAL_SECONDS,
+    sticky_seconds=settings.REPLICA_STICKY_PRIMARY_SECONDS,
+)
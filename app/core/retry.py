@@ -0,0 +1,62 @@
+import logging
+import random
+import time
+from collections.abc import Callable
+from typing import TypeVar
+
+from sqlalchemy.exc import DBAPIError
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Errors that go away when the transaction is simply run again
+RETRYABLE_SQLSTATES = {
+    "40001": "serialization_failure",
+    "40P01": "deadlock_detected",
+    "55P03": "lock_not_available",
+}
+
+
+def retryable_reason(exc: BaseException) -> str | None:
+    if not isinstance(exc, DBAPIError):
+        return None
+    return RETRYABLE_SQLSTATES.get(getattr(exc.orig, "sqlstate", None))
+
+
+def backoff_delay(attempt: int) -> float:
+    # Exponential backoff with full jitter, in seconds
+    ceiling = min(
+        settings.DB_RETRY_MAX_DELAY_MS,
+        settings.DB_RETRY_BASE_DELAY_MS * 2**attempt,
+    )
+    return random.uniform(0, ceiling) / 1000
+
+
+def run_with_retry(session: Session, operation: Callable[[], T], name: str) -> T:
+    """
+    Runs a unit of work that ends in its own commit, rolling back and running
+    it again after a deadlock, serialization failure or lock timeout. The last
+    error is raised once DB_RETRY_MAX_ATTEMPTS is used up.
+    """
+    attempt = 0
+    while True:
+        try:
+            return operation()
+        except DBAPIError as exc:
+            session.rollback()
+            reason = retryable_reason(exc)
+            attempt += 1
+            if not reason or attempt >= settings.DB_RETRY_MAX_ATTEMPTS:
+                raise
+            delay = backoff_delay(attempt)
+            metrics.incr(f"{name}.retries")
+            metrics.incr(f"{name}.{reason}")
+            logger.warning(
+                "%s hit %s, retry %s in %.0f ms", name, reason, attempt, delay * 1000
+            )
+            time.sleep(delay)
@@ -0,0 +1,70 @@
+"""
+Local stand-in for the exchange's order API, for tests and benchmarks.
+
+    fastapi run app/exchange_stub.py --port 8100
+
+Latency and failures are tuned with EXCHANGE_STUB_LATENCY_MS,
+EXCHANGE_STUB_JITTER_MS and EXCHANGE_STUB_FAILURE_RATE.
+"""
+
+import asyncio
+import random
+import uuid
+from decimal import Decimal
+
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+
+from app.core.config import settings
+
+app = FastAPI(title="Exchange stub")
+
+# client_order_id -> transaction code, so resent orders aren't filled twice
+orders: dict[str, str] = {}
+
+
+class OrderRequest(BaseModel):
+    symbol: str
+    amount: Decimal
+    client_order_id: str
+
+
+class OrderResponse(BaseModel):
+    client_order_id: str
+    transaction_code: str
+
+
+class BatchOrderRequest(BaseModel):
+    legs: list[OrderRequest]
+
+
+class BatchOrderResponse(BaseModel):
+    fills: list[OrderResponse]
+
+
+async def simulate_exchange() -> None:
+    latency = settings.EXCHANGE_STUB_LATENCY_MS + random.uniform(
+        0, settings.EXCHANGE_STUB_JITTER_MS
+    )
+    await asyncio.sleep(latency / 1000)
+    if random.random() < settings.EXCHANGE_STUB_FAILURE_RATE:
+        raise HTTPException(status_code=503, detail="Exchange unavailable")
+
+
+def fill(order: OrderRequest) -> OrderResponse:
+    transaction_code = orders.setdefault(order.client_order_id, uuid.uuid4().hex)
+    return OrderResponse(
+        client_order_id=order.client_order_id, transaction_code=transaction_code
+    )
+
+
+@app.post("/orders")
+async def create_order(order: OrderRequest) -> OrderResponse:
+    await simulate_exchange()
+    return fill(order)
+
+
+@app.post("/orders/batch")
+async def create_batch_order(order: BatchOrderRequest) -> BatchOrderResponse:
+    await simulate_exchange()
+    return BatchOrderResponse(fills=[fill(leg) for leg in order.legs])
@@ -0,0 +1,52 @@
+import argparse
+import logging
+import uuid
+from datetime import datetime
+
+from app.adapters import LedgerFilter, stream_ledger
+from app.core.config import settings
+from app.core.replica import read_router
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Export a ledger table to a file")
+    parser.add_argument("table", choices=["purchases", "transactions"])
+    parser.add_argument("output")
+    parser.add_argument("--format", choices=["csv", "arrow"], default="csv")
+    parser.add_argument("--since", type=datetime.fromisoformat)
+    parser.add_argument("--until", type=datetime.fromisoformat)
+    parser.add_argument("--user-id", type=uuid.UUID)
+    parser.add_argument("--after-created-at", type=datetime.fromisoformat)
+    parser.add_argument("--after-id", type=uuid.UUID)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    filters = LedgerFilter(
+        since=args.since,
+        until=args.until,
+        user_id=args.user_id,
+        after_created_at=args.after_created_at,
+        after_id=args.after_id,
+    )
+    logger.info("Exporting %s to %s", args.table, args.output)
+    written = 0
+    with open(args.output, "wb") as output:
+        for chunk in stream_ledger(
+            read_router.engine_for(None),
+            args.table,
+            args.format,
+            filters,
+            settings.LEDGER_EXPORT_CHUNK_SIZE,
+        ):
+            output.write(chunk)
+            written += len(chunk)
+    logger.info("Exported %s bytes", written)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,23 @@
+import asyncio
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+
 import sentry_sdk
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from fastapi.routing import APIRoute
+from sqlalchemy.exc import DBAPIError
 from starlette.middleware.cors import CORSMiddleware
+from app.adapters import event_broker, market_catalog
+from app.api.deps import user_invalidation_listener
 from app.api.main import api_router
 from app.core.config import settings
+from app.core.db import engine
+from app.core.metrics import metrics
+from app.core.replica import read_router
+from app.core.retry import retryable_reason
+from app.core.security import HasherBusyError
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
@@ -13,11 +27,63 @@ def custom_generate_unique_id(route: APIRoute) -> str:
 if settings.SENTRY_DSN and settings.ENVIRONMENT != "local":
     sentry_sdk.init(dsn=str(settings.SENTRY_DSN), enable_tracing=True)
 
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncGenerator[None, None]:
+    await run_in_threadpool(market_catalog.start, engine)
+    event_broker.start(engine, asyncio.get_running_loop())
+    user_invalidations = user_invalidation_listener(engine)
+    user_invalidations.start()
+    yield
+    await run_in_threadpool(user_invalidations.stop)
+    await run_in_threadpool(event_broker.stop)
+    await run_in_threadpool(market_catalog.stop)
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     generate_unique_id_function=custom_generate_unique_id,
+    lifespan=lifespan,
 )
 
+
+@app.middleware("http")
+async def sticky_primary_after_write(request: Request, call_next):
+    response = await call_next(request)
+    # Send this client's reads to the primary until replicas have caught up
+    authorization = request.headers.get("Authorization")
+    if authorization and request.method not in ("GET", "HEAD", "OPTIONS"):
+        read_router.mark_write(authorization)
+    return response
+
+
+@app.exception_handler(DBAPIError)
+async def database_contention_handler(
+    _request: Request, exc: DBAPIError
+) -> JSONResponse:
+    # Deadlocks and lock timeouts are safe to retry, especially with an
+    # Idempotency-Key, so tell the client instead of answering 500
+    reason = retryable_reason(exc)
+    if not reason:
+        raise exc
+    metrics.incr(f"api.{reason}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Database is busy, please retry"},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.exception_handler(HasherBusyError)
+async def hasher_busy_handler(_request: Request, _exc: HasherBusyError) -> JSONResponse:
+    # Shed login and signup load early rather than starving other requests
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many login attempts, please retry"},
+        headers={"Retry-After": "1"},
+    )
+
+
 # Set all CORS enabled origins
 if settings.all_cors_origins:
     app.add_middleware(
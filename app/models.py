@@ -1,11 +1,13 @@
 import uuid
 import enum
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Any, Optional
 
 from decimal import Decimal
 from pydantic import EmailStr
-from sqlmodel import Field, SQLModel, Column, Enum
+from sqlalchemy import Index, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlmodel import Field, SQLModel, Column, Enum, UniqueConstraint
 
 
 class BaseTable(SQLModel):
@@ -32,7 +34,7 @@ class Market(BaseTable, table=True):
     __tablename__ = "markets"
     id: int | None = Field(default=None, primary_key=True)
     name: str
-    symbol: str
+    symbol: str = Field(index=True)
     active: bool
     price: Decimal = Field(default=0, max_digits=16, decimal_places=6)
     base_currency_id: int = Field(
@@ -57,6 +59,9 @@ class WalletUpdate(SQLModel):
 
 class Wallet(BaseTable, table=True):
     __tablename__ = "wallets"
+    __table_args__ = (
+        Index("ix_wallets_user_id_currency_id", "user_id", "currency_id"),
+    )
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     name: str
     balance: Decimal = Field(default=0, max_digits=16, decimal_places=6)
@@ -84,6 +89,9 @@ class TransactionType(str, enum.Enum):
 
 class Transaction(BaseTable, table=True):
     __tablename__ = "transactions"
+    __table_args__ = (
+        Index("ix_transactions_wallet_id_created_at", "wallet_id", "created_at"),
+    )
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     amount: Decimal = Field(default=0, max_digits=16, decimal_places=6)
     status: TransactionStatus = Field(sa_column=Column(Enum(TransactionStatus)))
@@ -104,8 +112,31 @@ class PurchaseRequest(SQLModel):
     market: str
 
 
+class PurchaseBatchItemResult(SQLModel):
+    index: int
+    market: str
+    amount: Decimal
+    status: PurchaseStatus
+    purchase_id: uuid.UUID | None = None
+    detail: str | None = None
+
+
+class PurchaseBatchResult(SQLModel):
+    data: list[PurchaseBatchItemResult]
+    count: int
+
+
 class Purchase(BaseTable, table=True):
     __tablename__ = "purchases"
+    __table_args__ = (
+        Index("ix_purchases_user_id_created_at", "user_id", "created_at"),
+        # Queued purchases waiting for the purchase finalizer
+        Index(
+            "ix_purchases_pending",
+            "created_at",
+            postgresql_where=text("status = 'PENDING'"),
+        ),
+    )
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     status: PurchaseStatus = Field(sa_column=Column(Enum(PurchaseStatus)))
     amount: Decimal = Field(default=0, max_digits=16, decimal_places=6)
@@ -114,22 +145,142 @@ class Purchase(BaseTable, table=True):
         foreign_key="users.id", nullable=False, ondelete="CASCADE"
     )
     market_id: int = Field(foreign_key="markets.id", nullable=False, ondelete="CASCADE")
+    # Set when the amount is added to the settlement stripes, so a redelivered
+    # settlement message can't add it twice
+    settled_at: datetime | None = Field(default=None, nullable=True)
+
+
+class PurchasePublic(SQLModel):
+    id: uuid.UUID
+    status: PurchaseStatus
+    amount: Decimal
+    price: Decimal
+    market_id: int
+    created_at: datetime
+
+
+class PurchasesPublic(SQLModel):
+    data: list[PurchasePublic]
+    next_cursor: str | None = None
+
+
+class IdempotencyKey(BaseTable, table=True):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (UniqueConstraint("user_id", "key"),)
+    id: int | None = Field(default=None, primary_key=True)
+    key: str = Field(max_length=255)
+    expires_at: datetime = Field(nullable=False, index=True)
+    user_id: uuid.UUID = Field(
+        foreign_key="users.id", nullable=False, ondelete="CASCADE"
+    )
+    purchase_id: uuid.UUID = Field(
+        foreign_key="purchases.id", nullable=False, ondelete="CASCADE"
+    )
+
+
+class OrderSide(str, enum.Enum):
+    BUY = "BUY"
+    SELL = "SELL"
+
+
+class SettlementOutbox(SQLModel, table=True):
+    __tablename__ = "settlement_outbox"
+    id: int | None = Field(default=None, primary_key=True)
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc), nullable=False
+    )
+    # No foreign key: rows are short lived and written next to their purchase
+    purchase_id: uuid.UUID = Field(nullable=False)
+    market_id: int = Field(nullable=False)
+    # Side of the exchange the purchase has to be covered on
+    side: OrderSide = Field(
+        default=OrderSide.BUY,
+        sa_column=Column(Enum(OrderSide), server_default="BUY", nullable=False),
+    )
+
+
+class OrderBookSnapshot(SQLModel, table=True):
+    """
+    Resting orders of a market's internal order book, written by the
+    matching engine in the same transaction that consumes their outbox rows.
+    """
+
+    __tablename__ = "order_book_snapshots"
+    market_id: int = Field(
+        foreign_key="markets.id", primary_key=True, ondelete="CASCADE"
+    )
+    orders: list[dict[str, Any]] = Field(
+        default_factory=list, sa_column=Column(JSONB, nullable=False)
+    )
+    updated_at: datetime = Field(nullable=False)
+
+
+class WalletReconciliation(SQLModel, table=True):
+    """
+    Last reconciled state of a wallet: its balance as of `watermark`, so the
+    next run only has to read ledger rows created after it.
+    """
+
+    __tablename__ = "wallet_reconciliations"
+    wallet_id: uuid.UUID = Field(
+        foreign_key="wallets.id", primary_key=True, ondelete="CASCADE"
+    )
+    balance: Decimal = Field(max_digits=16, decimal_places=6)
+    watermark: datetime = Field(nullable=False)
+    # Live balance minus the balance the ledger explains, at the last check
+    drift: Decimal = Field(default=0, max_digits=16, decimal_places=6)
+    checked_at: datetime = Field(nullable=False)
+
+
+class SettlementStatus(str, enum.Enum):
+    OPEN = "OPEN"
+    CLOSED = "CLOSED"
+    IN_FLIGHT = "IN_FLIGHT"
+    SETTLED = "SETTLED"
+    FAILED = "FAILED"
 
 
 class Settlement(BaseTable, table=True):
     __tablename__ = "settlements"
+    __table_args__ = (
+        # One active accumulator per stripe of a market
+        Index(
+            "uq_settlements_market_id_stripe_active",
+            "market_id",
+            "stripe",
+            unique=True,
+            postgresql_where=text("active"),
+        ),
+        # Orders waiting for the dispatcher or the resend task
+        Index(
+            "ix_settlements_unsettled",
+            "status",
+            "updated_at",
+            postgresql_where=text("status IN ('CLOSED', 'IN_FLIGHT', 'FAILED')"),
+        ),
+    )
     id: int | None = Field(default=None, primary_key=True)
     transaction_code: str | None = Field(nullable=True)
+    # Client order id shared by the stripes closed into one exchange order
+    order_id: str | None = Field(default=None, nullable=True, index=True)
+    status: SettlementStatus = Field(
+        default=SettlementStatus.OPEN,
+        sa_column=Column(Enum(SettlementStatus), nullable=False),
+    )
     active: bool
     amount: Decimal = Field(default=0, max_digits=16, decimal_places=6)
+    stripe: int = Field(default=0, nullable=False)
     market_id: int = Field(foreign_key="markets.id", nullable=False, ondelete="CASCADE")
 
 
 class SettlementUpdate(BaseTable):
     transaction_code: str | None = None
+    order_id: str | None = None
+    status: SettlementStatus | None = None
     active: bool | None = None
     market_id: int | None = None
     amount: Decimal | None = None
+    stripe: int | None = None
 
 
 class UserBase(SQLModel):
@@ -167,7 +318,9 @@ class UpdatePassword(SQLModel):
 class User(UserBase, table=True):
     __tablename__ = "users"
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
-    email: EmailStr | None = Field(default=None, max_length=255)
+    email: EmailStr | None = Field(
+        default=None, unique=True, index=True, max_length=255
+    )
     full_name: str
     verified: bool = Field(default=False)
     hashed_password: str
@@ -181,6 +334,7 @@ class UserPublic(UserBase):
 class UsersPublic(SQLModel):
     data: list[UserPublic]
     count: int
+    next_cursor: str | None = None
 
 
 # Generic message
@@ -197,6 +351,7 @@ class Token(SQLModel):
 # Contents of JWT token
 class TokenPayload(SQLModel):
     sub: str | None = None
+    exp: int | None = None
 
 
 class NewPassword(SQLModel):
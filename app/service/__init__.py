@@ -1,4 +1,5 @@
-from .purchase_service import PurchaseService
+from .purchase_service import PurchaseService, AsyncPurchaseService
+from .order_book import BookOrder, Fill, OrderBook
 
 
-__all__ = ("PurchaseService",)
+__all__ = ("PurchaseService", "AsyncPurchaseService", "BookOrder", "Fill", "OrderBook")
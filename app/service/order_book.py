@@ -0,0 +1,124 @@
+import heapq
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Any
+
+from app.models import OrderSide
+
+
+@dataclass(eq=False)
+class BookOrder:
+    order_id: str
+    side: OrderSide
+    price: Decimal
+    # Remaining amount, reduced in place as the order is filled
+    amount: Decimal
+    # Arrival order, ties on price are filled oldest first
+    sequence: int
+    received_at: float
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "order_id": self.order_id,
+            "side": self.side.value,
+            "price": str(self.price),
+            "amount": str(self.amount),
+            "sequence": self.sequence,
+            "received_at": self.received_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "BookOrder":
+        return cls(
+            order_id=data["order_id"],
+            side=OrderSide(data["side"]),
+            price=Decimal(data["price"]),
+            amount=Decimal(data["amount"]),
+            sequence=data["sequence"],
+            received_at=data["received_at"],
+        )
+
+
+@dataclass(frozen=True)
+class Fill:
+    buy_order_id: str
+    sell_order_id: str
+    price: Decimal
+    amount: Decimal
+
+
+class OrderBook:
+    """
+    Price-time priority limit order book of one market, kept as two heaps:
+    bids keyed on (-price, sequence) and asks on (price, sequence). Not
+    thread safe, a book has a single writer.
+    """
+
+    def __init__(self) -> None:
+        self._bids: list[tuple[Decimal, int, BookOrder]] = []
+        self._asks: list[tuple[Decimal, int, BookOrder]] = []
+
+    def __len__(self) -> int:
+        return len(self._bids) + len(self._asks)
+
+    def submit(self, order: BookOrder) -> list[Fill]:
+        """
+        Matches the order against the other side of the book at the resting
+        orders' prices and rests whatever is left of it.
+        """
+        if order.side == OrderSide.BUY:
+            own, opposite = self._bids, self._asks
+        else:
+            own, opposite = self._asks, self._bids
+        fills = []
+        while order.amount > 0 and opposite:
+            resting = opposite[0][2]
+            if order.side == OrderSide.BUY and resting.price > order.price:
+                break
+            if order.side == OrderSide.SELL and resting.price < order.price:
+                break
+            amount = min(order.amount, resting.amount)
+            buy, sell = (
+                (order, resting) if order.side == OrderSide.BUY else (resting, order)
+            )
+            fills.append(Fill(buy.order_id, sell.order_id, resting.price, amount))
+            order.amount -= amount
+            resting.amount -= amount
+            if not resting.amount:
+                heapq.heappop(opposite)
+        if order.amount > 0:
+            heapq.heappush(own, (self._key(order), order.sequence, order))
+        return fills
+
+    def expire(self, side: OrderSide, received_before: float) -> list[BookOrder]:
+        """
+        Takes the orders of one side that have rested since before
+        `received_before` off the book, oldest first.
+        """
+        book = self._bids if side == OrderSide.BUY else self._asks
+        expired = [entry[2] for entry in book if entry[2].received_at < received_before]
+        if expired:
+            book[:] = [
+                entry for entry in book if entry[2].received_at >= received_before
+            ]
+            heapq.heapify(book)
+        return sorted(expired, key=lambda order: order.sequence)
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        orders = [entry[2] for entry in self._bids + self._asks]
+        return [order.to_dict() for order in sorted(orders, key=lambda o: o.sequence)]
+
+    @classmethod
+    def restore(cls, orders: list[dict[str, Any]]) -> "OrderBook":
+        book = cls()
+        for data in orders:
+            order = BookOrder.from_dict(data)
+            target = book._bids if order.side == OrderSide.BUY else book._asks
+            target.append((book._key(order), order.sequence, order))
+        heapq.heapify(book._bids)
+        heapq.heapify(book._asks)
+        return book
+
+    @staticmethod
+    def _key(order: BookOrder) -> Decimal:
+        return -order.price if order.side == OrderSide.BUY else order.price
@@ -1,10 +1,36 @@
 import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, NoReturn
+from sqlalchemy import Row
 from sqlmodel import Session
-from app.models import Market, User, Transaction, Wallet, WalletUpdate, Purchase
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.models import (
+    Market,
+    User,
+    Transaction,
+    Wallet,
+    WalletUpdate,
+    Purchase,
+    PurchaseRequest,
+    PurchaseStatus,
+    PurchaseBatchItemResult,
+    IdempotencyKey,
+    SettlementOutbox,
+)
 from decimal import Decimal
-from app.adapters import WalletRepository, TransactionRepository, PurchaseRepository
+from app.adapters import (
+    WalletRepository,
+    TransactionRepository,
+    PurchaseRepository,
+    AsyncWalletRepository,
+    AsyncPurchaseRepository,
+    IdempotencyKeyRepository,
+    AsyncIdempotencyKeyRepository,
+    SettlementOutboxRepository,
+    market_catalog,
+)
+from app.core.config import settings
 from fastapi import HTTPException
-from app.worker.tasks import settle_purchase
 
 logger = logging.getLogger(__name__)
 
@@ -18,18 +44,120 @@ class PurchaseService:
         self.db_session = db_session
         self.user = user
 
-    def purchase(self, market: Market, amount: Decimal) -> Purchase:
+    def purchase(
+        self, market: Market, amount: Decimal, idempotency_key: str | None = None
+    ) -> Purchase:
+        if idempotency_key:
+            stored = self.get_idempotent_purchase(idempotency_key, market, amount)
+            if stored:
+                return stored
+        if settings.PURCHASE_EXECUTION_MODE == "atomic":
+            purchase = self.purchase_atomic(market, amount)
+        elif settings.PURCHASE_EXECUTION_MODE == "queued":
+            purchase = self.purchase_queued(market, amount)
+        else:
+            purchase = self.purchase_orm(market, amount)
+        if idempotency_key and not IdempotencyKeyRepository().claim(
+            self.db_session, self.build_idempotency_key(idempotency_key, purchase)
+        ):
+            # A concurrent retry with the same key committed first
+            self.db_session.rollback()
+            return self.require_idempotent_purchase(
+                self.get_idempotent_purchase(idempotency_key, market, amount)
+            )
+        if purchase.status == PurchaseStatus.DONE:
+            # Queued purchases are settled once the finalizer completes them
+            self.settle_with_exchange(purchase)
+        self.db_session.commit()
+
+        return purchase
+
+    def purchase_orm(self, market: Market, amount: Decimal) -> Purchase:
         qoute_wallet = self.get_user_wallet(market.qoute_currency_id)
         base_wallet = self.get_user_wallet(market.base_currency_id)
-        self.check_user_balance(qoute_wallet, amount * market.price)
-        self.make_transaction(base_wallet, qoute_wallet, amount, market.price)
-        purchase = self.create_purchase(market, amount, amount * market.price)
-        self.db_session.commit()
-        self.db_session.refresh(purchase)
-        self.settle_with_exchange(purchase)
+        price = self.get_price(market)
+        self.check_user_balance(qoute_wallet, amount * price)
+        self.make_transaction(base_wallet, qoute_wallet, amount, price)
+        return self.create_purchase(market, amount, amount * price)
+
+    def purchase_atomic(self, market: Market, amount: Decimal) -> Purchase:
+        """
+        Runs the balance check, both wallet updates, the ledger rows and the
+        purchase insert as one statement, so wallet row locks are held for a
+        single round trip plus the commit.
+        """
+        purchase = self.build_purchase(market, amount, amount * self.get_price(market))
+        result = PurchaseRepository().execute_atomic(
+            self.db_session, purchase, market.base_currency_id, market.qoute_currency_id
+        )
+        if not result.purchase_id:
+            self.db_session.rollback()
+            self.raise_atomic_failure(result)
+        return purchase
+
+    def purchase_queued(self, market: Market, amount: Decimal) -> Purchase:
+        """
+        Locks the cost in the qoute wallet and inserts a PENDING purchase in
+        one statement. Only the qoute wallet row is touched, so a burst of
+        purchases doesn't queue on the base wallet too.
+        """
+        purchase = self.build_purchase(
+            market, amount, amount * self.get_price(market), PurchaseStatus.PENDING
+        )
+        result = PurchaseRepository().execute_queued(
+            self.db_session, purchase, market.base_currency_id, market.qoute_currency_id
+        )
+        if not result.purchase_id:
+            self.db_session.rollback()
+            self.raise_atomic_failure(result)
+        return purchase
+
+    def get_idempotent_purchase(
+        self, idempotency_key: str, market: Market, amount: Decimal
+    ) -> Purchase | None:
+        purchase = IdempotencyKeyRepository().get_purchase(
+            self.db_session, self.user, idempotency_key
+        )
+        return self.check_idempotent_purchase(purchase, market, amount)
 
+    def check_idempotent_purchase(
+        self, purchase: Purchase | None, market: Market, amount: Decimal
+    ) -> Purchase | None:
+        if purchase and (purchase.market_id != market.id or purchase.amount != amount):
+            raise HTTPException(
+                status_code=422,
+                detail="Idempotency key was already used for a different purchase",
+            )
         return purchase
 
+    def require_idempotent_purchase(self, purchase: Purchase | None) -> Purchase:
+        # The key is taken but its purchase isn't readable, it expired and was
+        # purged or the winning request hasn't finished
+        if not purchase:
+            raise HTTPException(
+                status_code=409,
+                detail="A purchase with this Idempotency-Key is in progress, retry later",
+            )
+        return purchase
+
+    def build_idempotency_key(
+        self, idempotency_key: str, purchase: Purchase
+    ) -> IdempotencyKey:
+        now = datetime.now(timezone.utc)
+        return IdempotencyKey(
+            key=idempotency_key,
+            user_id=self.user.id,
+            purchase_id=purchase.id,
+            created_at=now,
+            updated_at=now,
+            expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL_SECONDS),
+        )
+
+    def raise_atomic_failure(self, result: Row[Any]) -> NoReturn:
+        if result.wallets < 2:
+            raise HTTPException(status_code=404, detail="No wallet found")
+        raise HTTPException(status_code=422, detail="Not enough credit")
+
     def get_user_wallet(self, currency_id: int) -> Wallet:
         wallet = WalletRepository().get_by_currency_for_update(
             self.db_session, currency_id, self.user
@@ -38,6 +166,10 @@ class PurchaseService:
             raise HTTPException(status_code=404, detail="No wallet found")
         return wallet
 
+    def get_price(self, market: Market) -> Decimal:
+        # Live price from the feed, the markets row only lags behind it
+        return market_catalog.get_price(market)
+
     def check_user_balance(self, wallet: Wallet, total_price: Decimal) -> bool:
         if (wallet.balance - wallet.locked) >= total_price:
             return True
@@ -59,6 +191,15 @@ class PurchaseService:
             self.db_session, qoute_wallet, qoute_wallet_update
         )
 
+        transaction_repository = TransactionRepository()
+        for transaction in self.build_transactions(
+            base_wallet, qoute_wallet, amount, price
+        ):
+            transaction_repository.new(self.db_session, transaction)
+
+    def build_transactions(
+        self, base_wallet: Wallet, qoute_wallet: Wallet, amount: Decimal, price: Decimal
+    ) -> tuple[Transaction, Transaction]:
         base_transaction = Transaction(
             amount=amount,
             status="DONE",
@@ -69,24 +210,210 @@ class PurchaseService:
         qoute_transaction = Transaction(
             amount=amount * price,
             status="DONE",
-            type="CREDIT",
+            type="DEBT",
             wallet_id=qoute_wallet.id,
         )
+        return base_transaction, qoute_transaction
 
-        transaction_repository = TransactionRepository()
-        transaction_repository.new(self.db_session, base_transaction)
-        transaction_repository.new(self.db_session, qoute_transaction)
-
-    def create_purchase(self, market: Market, amount: Decimal, price: Decimal):
-        purchase = Purchase(
-            status="DONE",
+    def build_purchase(
+        self,
+        market: Market,
+        amount: Decimal,
+        price: Decimal,
+        status: PurchaseStatus = PurchaseStatus.DONE,
+    ) -> Purchase:
+        return Purchase(
+            status=status,
             amount=amount,
             price=price,
             user_id=self.user.id,
             market_id=market.id,
         )
 
+    def create_purchase(self, market: Market, amount: Decimal, price: Decimal):
+        purchase = self.build_purchase(market, amount, price)
         return PurchaseRepository().new(self.db_session, purchase)
 
+    def purchase_batch(
+        self, purchase_requests: list[PurchaseRequest], markets: dict[str, Market]
+    ) -> list[PurchaseBatchItemResult]:
+        """
+        Executes many orders in one transaction. Every wallet involved is
+        locked once up front, balances are applied in memory in request order
+        and the ledger/purchase rows are written with one bulk insert each.
+        """
+        wallets = WalletRepository().get_by_currencies_for_update(
+            self.db_session,
+            {
+                currency_id
+                for market in markets.values()
+                for currency_id in (market.base_currency_id, market.qoute_currency_id)
+            },
+            self.user,
+        )
+        balances = {
+            currency_id: wallet.balance for currency_id, wallet in wallets.items()
+        }
+
+        results: list[PurchaseBatchItemResult] = []
+        transactions: list[Transaction] = []
+        purchases: list[Purchase] = []
+        for index, purchase_request in enumerate(purchase_requests):
+            result = PurchaseBatchItemResult(
+                index=index,
+                market=purchase_request.market,
+                amount=purchase_request.amount,
+                status=PurchaseStatus.FAILED,
+            )
+            results.append(result)
+
+            market = markets.get(purchase_request.market)
+            if not market:
+                result.detail = "Market not found"
+                continue
+            base_wallet = wallets.get(market.base_currency_id)
+            qoute_wallet = wallets.get(market.qoute_currency_id)
+            if not base_wallet or not qoute_wallet:
+                result.detail = "No wallet found"
+                continue
+            price = self.get_price(market)
+            total_price = purchase_request.amount * price
+            if balances[qoute_wallet.currency_id] - qoute_wallet.locked < total_price:
+                result.detail = "Not enough credit"
+                continue
+
+            balances[base_wallet.currency_id] += purchase_request.amount
+            balances[qoute_wallet.currency_id] -= total_price
+            transactions.extend(
+                self.build_transactions(
+                    base_wallet, qoute_wallet, purchase_request.amount, price
+                )
+            )
+            purchase = self.build_purchase(market, purchase_request.amount, total_price)
+            purchases.append(purchase)
+            result.status = PurchaseStatus.DONE
+            result.purchase_id = purchase.id
+
+        if purchases:
+            wallet_repository = WalletRepository()
+            for currency_id, wallet in wallets.items():
+                if balances[currency_id] != wallet.balance:
+                    wallet_repository.update_instance(
+                        self.db_session,
+                        wallet,
+                        WalletUpdate(balance=balances[currency_id]),
+                    )
+            TransactionRepository().new_many(self.db_session, transactions)
+            PurchaseRepository().new_many(self.db_session, purchases)
+        self.settle_many_with_exchange(purchases)
+        self.db_session.commit()
+
+        return results
+
     def settle_with_exchange(self, purchase: Purchase):
-        settle_purchase.delay(purchase=purchase.id)
+        # Written in the purchase transaction, published by the outbox relay
+        # along with the purchase's status event
+        SettlementOutboxRepository().new(
+            self.db_session,
+            SettlementOutbox(purchase_id=purchase.id, market_id=purchase.market_id),
+        )
+
+    def settle_many_with_exchange(self, purchases: list[Purchase]):
+        SettlementOutboxRepository().new_many(
+            self.db_session,
+            [
+                SettlementOutbox(purchase_id=purchase.id, market_id=purchase.market_id)
+                for purchase in purchases
+            ],
+        )
+
+
+class AsyncPurchaseService(PurchaseService):
+    """
+    PurchaseService for an AsyncSession, so a purchase waiting on wallet row
+    locks yields the event loop instead of holding a threadpool slot.
+    """
+
+    db_session: AsyncSession
+
+    def __init__(self, db_session: AsyncSession, user: User) -> None:
+        self.db_session = db_session
+        self.user = user
+
+    async def purchase(  # type: ignore[override]
+        self, market: Market, amount: Decimal, idempotency_key: str | None = None
+    ) -> Purchase:
+        if idempotency_key:
+            stored = await self.get_idempotent_purchase(idempotency_key, market, amount)
+            if stored:
+                return stored
+        if settings.PURCHASE_EXECUTION_MODE == "atomic":
+            purchase = await self.purchase_atomic(market, amount)
+        elif settings.PURCHASE_EXECUTION_MODE == "queued":
+            purchase = await self.purchase_queued(market, amount)
+        else:
+            purchase = await self.purchase_orm(market, amount)
+        if idempotency_key and not await AsyncIdempotencyKeyRepository().claim(
+            self.db_session, self.build_idempotency_key(idempotency_key, purchase)
+        ):
+            await self.db_session.rollback()
+            return self.require_idempotent_purchase(
+                await self.get_idempotent_purchase(idempotency_key, market, amount)
+            )
+        if purchase.status == PurchaseStatus.DONE:
+            self.settle_with_exchange(purchase)
+        await self.db_session.commit()
+
+        return purchase
+
+    async def purchase_orm(  # type: ignore[override]
+        self, market: Market, amount: Decimal
+    ) -> Purchase:
+        qoute_wallet = await self.get_user_wallet(market.qoute_currency_id)
+        base_wallet = await self.get_user_wallet(market.base_currency_id)
+        price = self.get_price(market)
+        self.check_user_balance(qoute_wallet, amount * price)
+        self.make_transaction(base_wallet, qoute_wallet, amount, price)
+        return self.create_purchase(market, amount, amount * price)
+
+    async def purchase_atomic(  # type: ignore[override]
+        self, market: Market, amount: Decimal
+    ) -> Purchase:
+        purchase = self.build_purchase(market, amount, amount * self.get_price(market))
+        result = await AsyncPurchaseRepository().execute_atomic(
+            self.db_session, purchase, market.base_currency_id, market.qoute_currency_id
+        )
+        if not result.purchase_id:
+            await self.db_session.rollback()
+            self.raise_atomic_failure(result)
+        return purchase
+
+    async def purchase_queued(  # type: ignore[override]
+        self, market: Market, amount: Decimal
+    ) -> Purchase:
+        purchase = self.build_purchase(
+            market, amount, amount * self.get_price(market), PurchaseStatus.PENDING
+        )
+        result = await AsyncPurchaseRepository().execute_queued(
+            self.db_session, purchase, market.base_currency_id, market.qoute_currency_id
+        )
+        if not result.purchase_id:
+            await self.db_session.rollback()
+            self.raise_atomic_failure(result)
+        return purchase
+
+    async def get_idempotent_purchase(  # type: ignore[override]
+        self, idempotency_key: str, market: Market, amount: Decimal
+    ) -> Purchase | None:
+        purchase = await AsyncIdempotencyKeyRepository().get_purchase(
+            self.db_session, self.user, idempotency_key
+        )
+        return self.check_idempotent_purchase(purchase, market, amount)
+
+    async def get_user_wallet(self, currency_id: int) -> Wallet:  # type: ignore[override]
+        wallet = await AsyncWalletRepository().get_by_currency_for_update(
+            self.db_session, currency_id, self.user
+        )
+        if not wallet:
+            raise HTTPException(status_code=404, detail="No wallet found")
+        return wallet
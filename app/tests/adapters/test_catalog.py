@@ -0,0 +1,14 @@
+from decimal import Decimal
+
+from app.adapters import MarketCatalog
+from app.models import Market
+
+
+def test_live_price_overrides_stored_price() -> None:
+    catalog = MarketCatalog()
+    market = Market(
+        id=1, name="ABANUSD", symbol="ABANUSD", active=True, price=Decimal(4)
+    )
+    assert catalog.get_price(market) == Decimal(4)
+    catalog.update_prices('{"1": "4.25"}')
+    assert catalog.get_price(market) == Decimal("4.25")
@@ -0,0 +1,42 @@
+import uuid
+from unittest.mock import patch
+
+from app.adapters.events import (
+    PURCHASE_EVENTS_CHANNEL,
+    SETTLEMENT_EVENTS_CHANNEL,
+    EventBroker,
+)
+from app.core.config import settings
+
+
+def test_event_broker_fans_out_to_subscribers() -> None:
+    broker = EventBroker()
+    user_id = uuid.uuid4()
+    own = broker.subscribe(user_id, {1})
+    other = broker.subscribe(uuid.uuid4(), None)
+    purchase_event = {"user_id": str(user_id), "status": "DONE"}
+    settlement_event = {"market_id": 2, "status": "DONE"}
+
+    broker._fan_out(PURCHASE_EVENTS_CHANNEL, [purchase_event])
+    broker._fan_out(SETTLEMENT_EVENTS_CHANNEL, [settlement_event])
+
+    assert own.queue.get_nowait() == (PURCHASE_EVENTS_CHANNEL, purchase_event)
+    # Settlements of market 2 only reach the subscriber of every market
+    assert own.queue.empty()
+    assert other.queue.get_nowait() == (SETTLEMENT_EVENTS_CHANNEL, settlement_event)
+    assert other.queue.empty()
+
+
+def test_event_broker_drops_slow_subscriber() -> None:
+    broker = EventBroker()
+    with patch.object(settings, "EVENTS_SUBSCRIBER_QUEUE_SIZE", 2):
+        slow = broker.subscribe(uuid.uuid4(), None)
+    events = [{"market_id": 1, "status": "DONE"} for _ in range(3)]
+
+    broker._fan_out(SETTLEMENT_EVENTS_CHANNEL, events)
+    broker._fan_out(SETTLEMENT_EVENTS_CHANNEL, events)
+
+    assert slow.queue.get_nowait() == (SETTLEMENT_EVENTS_CHANNEL, events[0])
+    assert slow.queue.get_nowait() is None
+    assert slow.queue.empty()
+    assert slow not in broker._subscriptions
@@ -0,0 +1,97 @@
+import json
+from decimal import Decimal
+
+import httpx
+import pytest
+
+from app import exchange_stub
+from app.adapters import (
+    CircuitBreaker,
+    CircuitOpenError,
+    ExchangeClient,
+    ExchangeError,
+    OrderLeg,
+)
+
+
+def make_client(
+    transport: httpx.AsyncBaseTransport, failure_threshold: int = 3
+) -> ExchangeClient:
+    return ExchangeClient(
+        "http://exchange",
+        timeout=1.0,
+        max_connections=2,
+        max_concurrency=2,
+        breaker=CircuitBreaker(failure_threshold, reset_timeout=60),
+        max_legs=2,
+        transport=transport,
+    )
+
+
+def test_buy_returns_transaction_code() -> None:
+    client = make_client(httpx.ASGITransport(app=exchange_stub.app))
+    try:
+        code = client.buy("ABANUSD", Decimal("2.5"), "settlement-1")
+        assert code
+        # A resent order is answered with the original fill
+        assert client.buy("ABANUSD", Decimal("2.5"), "settlement-1") == code
+    finally:
+        client.close()
+
+
+def test_buy_many_splits_legs_into_multi_leg_orders() -> None:
+    requests: list[int] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        legs = json.loads(request.content)["legs"]
+        requests.append(len(legs))
+        fills = [
+            {"client_order_id": leg["client_order_id"], "transaction_code": "tx"}
+            for leg in legs
+        ]
+        return httpx.Response(200, json={"fills": fills})
+
+    client = make_client(httpx.MockTransport(handler))
+    legs = [OrderLeg("ABANUSD", Decimal(1), f"settlement-{i}") for i in range(5)]
+    try:
+        fills = client.buy_many(legs)
+        assert fills == {leg.client_order_id: "tx" for leg in legs}
+        assert sorted(requests) == [1, 2, 2]
+    finally:
+        client.close()
+
+
+def test_circuit_opens_after_repeated_failures() -> None:
+    calls = 0
+
+    def handler(_request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        return httpx.Response(503)
+
+    client = make_client(httpx.MockTransport(handler), failure_threshold=2)
+    try:
+        for _ in range(2):
+            with pytest.raises(ExchangeError):
+                client.buy("ABANUSD", Decimal(1), "settlement-2")
+        with pytest.raises(CircuitOpenError):
+            client.buy("ABANUSD", Decimal(1), "settlement-2")
+        assert calls == 2
+    finally:
+        client.close()
+
+
+def test_malformed_answers_count_as_failures() -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/orders":
+            return httpx.Response(200, content=b"not json")
+        return httpx.Response(200, json={"unexpected": []})
+
+    client = make_client(httpx.MockTransport(handler), failure_threshold=2)
+    try:
+        with pytest.raises(ExchangeError):
+            client.buy("ABANUSD", Decimal(1), "settlement-3")
+        assert client.buy_many([OrderLeg("ABANUSD", Decimal(1), "settlement-4")]) == {}
+        assert client.breaker.is_open
+    finally:
+        client.close()
@@ -0,0 +1,90 @@
+import csv
+import io
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+import pyarrow as pa
+import pytest
+from sqlmodel import Session, select
+
+from app.adapters import LedgerFilter, stream_ledger
+from app.adapters.ledger import ledger_query
+from app.models import Market, Purchase, PurchaseStatus, User
+from app.tests.utils.user import create_random_user
+
+
+@pytest.fixture
+def buyer(db: Session) -> User:
+    """
+    A fresh user with two purchases, so a user filter selects exactly them.
+    """
+    user = create_random_user(db)
+    market = db.exec(select(Market)).first()
+    assert market
+    for amount in (1, 2):
+        db.add(
+            Purchase(
+                status=PurchaseStatus.DONE,
+                amount=Decimal(amount),
+                price=market.price * amount,
+                user_id=user.id,
+                market_id=market.id,
+            )
+        )
+        # Separate commits give the rows distinct created_at values
+        db.commit()
+    return user
+
+
+def test_filters_are_bound_parameters() -> None:
+    user_id = uuid.uuid4()
+    after_id = uuid.uuid4()
+    since = datetime(2026, 1, 1)
+    query, params = ledger_query(
+        "transactions",
+        LedgerFilter(
+            since=since, user_id=user_id, after_created_at=since, after_id=after_id
+        ),
+    )
+    assert "w.user_id = %(user_id)s" in query
+    assert "(l.created_at, l.id) > (%(after_created_at)s, %(after_id)s)" in query
+    assert query.endswith("ORDER BY l.created_at, l.id")
+    assert params == {
+        "since": since,
+        "user_id": user_id,
+        "after_created_at": since,
+        "after_id": after_id,
+    }
+
+
+def test_csv_export_streams_filtered_rows(db: Session, buyer: User) -> None:
+    engine = db.get_bind()
+    data = b"".join(
+        stream_ledger(engine, "purchases", "csv", LedgerFilter(user_id=buyer.id), 10)
+    )
+    rows = list(csv.DictReader(io.StringIO(data.decode())))
+    assert [Decimal(row["amount"]) for row in rows] == [Decimal(1), Decimal(2)]
+    assert {row["user_id"] for row in rows} == {str(buyer.id)}
+
+    # Resuming after the first row only returns the second
+    resumed = LedgerFilter(
+        user_id=buyer.id,
+        after_created_at=datetime.fromisoformat(rows[0]["created_at"]),
+        after_id=uuid.UUID(rows[0]["id"]),
+    )
+    data = b"".join(stream_ledger(engine, "purchases", "csv", resumed, 10))
+    assert [row["id"] for row in csv.DictReader(io.StringIO(data.decode()))] == [
+        rows[1]["id"]
+    ]
+
+
+def test_arrow_export_streams_record_batches(db: Session, buyer: User) -> None:
+    data = b"".join(
+        stream_ledger(
+            db.get_bind(), "purchases", "arrow", LedgerFilter(user_id=buyer.id), 1
+        )
+    )
+    table = pa.ipc.open_stream(data).read_all()
+    assert table.num_rows == 2
+    assert table.column("amount").to_pylist() == [Decimal(1), Decimal(2)]
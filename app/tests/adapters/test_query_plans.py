@@ -0,0 +1,182 @@
+import uuid
+from collections.abc import Callable, Generator
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any
+
+import pytest
+from sqlalchemy import event, text
+from sqlmodel import Session, select
+
+from app.adapters import (
+    IdempotencyKeyRepository,
+    MarketRepository,
+    OrderBookRepository,
+    PurchaseRepository,
+    ReconciliationRepository,
+    SettlementOutboxRepository,
+    SettlementRepository,
+    WalletRepository,
+)
+from app.core.config import settings
+from app.models import (
+    IdempotencyKey,
+    Market,
+    Purchase,
+    PurchaseStatus,
+    SettlementStatus,
+    User,
+    Wallet,
+)
+
+
+@pytest.fixture
+def session(db: Session) -> Generator[Session, None, None]:
+    # Everything runs in one transaction that is rolled back at the end
+    with db.get_bind().connect() as connection:
+        transaction = connection.begin()
+        with Session(bind=connection, join_transaction_mode="create_savepoint") as s:
+            # Tiny test tables are always cheaper to scan, so only allow a
+            # sequential scan where no index can serve the query at all
+            s.execute(text("SET LOCAL enable_seqscan = off"))
+            yield s
+        transaction.rollback()
+        # The matching engine's writer lock outlives the transaction
+        connection.execute(text("SELECT pg_advisory_unlock_all()"))
+
+
+def repository_calls(session: Session) -> list[Callable[[], Any]]:
+    user = session.exec(
+        select(User).where(User.email == settings.FIRST_SUPERUSER)
+    ).one()
+    market = session.exec(select(Market)).first()
+    assert market
+    wallet = session.exec(select(Wallet).where(Wallet.user_id == user.id)).first()
+    assert wallet
+    purchase, queued_purchase = (
+        Purchase(
+            status=status,
+            amount=Decimal(1),
+            price=market.price,
+            user_id=user.id,
+            market_id=market.id,
+        )
+        for status in (PurchaseStatus.DONE, PurchaseStatus.PENDING)
+    )
+    wallets = WalletRepository()
+    purchases = PurchaseRepository()
+    idempotency_keys = IdempotencyKeyRepository()
+    outbox = SettlementOutboxRepository()
+    settlements = SettlementRepository()
+    reconciliations = ReconciliationRepository()
+    order_books = OrderBookRepository()
+    now = datetime.now(timezone.utc)
+    # TransactionRepository.get_by_currency_for_update is left out, it is
+    # unused and locks every wallet of a currency by design. So is
+    # OrderBookRepository.get_snapshots, which loads every book on startup
+    return [
+        lambda: wallets.get_by_currency_for_update(
+            session, market.qoute_currency_id, user
+        ),
+        lambda: wallets.get_by_currencies_for_update(
+            session, [market.base_currency_id, market.qoute_currency_id], user
+        ),
+        lambda: MarketRepository().get_by_id(session, market.id),
+        lambda: MarketRepository().update_prices(session, {market.id: market.price}),
+        lambda: purchases.get_by_id(session, str(uuid.uuid4())),
+        lambda: purchases.get_by_ids(session, [str(uuid.uuid4())]),
+        lambda: purchases.get_history_page(
+            session, user.id, 10, (datetime.now(timezone.utc), uuid.uuid4())
+        ),
+        lambda: list(purchases.stream_history(session, user.id, 10)),
+        lambda: purchases.execute_atomic(
+            session, purchase, market.base_currency_id, market.qoute_currency_id
+        ),
+        lambda: purchases.execute_queued(
+            session, queued_purchase, market.base_currency_id, market.qoute_currency_id
+        ),
+        lambda: purchases.lock_pending(session, 10),
+        lambda: purchases.claim_unsettled(session, [str(purchase.id)]),
+        lambda: wallets.get_by_owners_for_update(
+            session, [(user.id, market.base_currency_id)]
+        ),
+        lambda: idempotency_keys.get_purchase(session, user, "key"),
+        # Runs after execute_atomic has inserted the purchase it references
+        lambda: idempotency_keys.claim(
+            session,
+            IdempotencyKey(
+                key="key", expires_at=now, user_id=user.id, purchase_id=purchase.id
+            ),
+        ),
+        lambda: idempotency_keys.delete_expired(session, 10),
+        lambda: outbox.lock_batch(session, 10),
+        lambda: outbox.delete_many(session, [1]),
+        lambda: settlements.create_active(session, market.id, 0),
+        lambda: settlements.get_active_lock(session, market.id),
+        lambda: settlements.get_active_stripes_lock(session, market.id, [0, 1]),
+        lambda: settlements.get_active_amount(session, market.id),
+        lambda: settlements.get_all_active_lock(session, market.id),
+        lambda: settlements.mark_order(
+            session, "settlement-0", SettlementStatus.SETTLED
+        ),
+        lambda: settlements.claim_closed_orders(session, 10),
+        lambda: settlements.record_fills(session, {"settlement-0": "tx"}),
+        lambda: settlements.mark_orders_failed(session, ["settlement-0"]),
+        lambda: settlements.get_unconfirmed_orders(session, datetime.now(timezone.utc)),
+        lambda: settlements.try_lock_market(session, market.id),
+        lambda: reconciliations.check_page(
+            session, uuid.UUID(int=0), uuid.UUID(int=2**128 - 1), now, 10
+        ),
+        lambda: reconciliations.save_checkpoints(
+            session,
+            [
+                {
+                    "wallet_id": wallet.id,
+                    "balance": wallet.balance,
+                    "watermark": now,
+                    "drift": Decimal(0),
+                    "checked_at": now,
+                }
+            ],
+        ),
+        lambda: order_books.save_snapshots(session, {market.id: []}),
+        lambda: order_books.try_lock_writer(session),
+        lambda: order_books.holds_writer_lock(session),
+    ]
+
+
+def seq_scans(plan: dict[str, Any]) -> list[str]:
+    found = []
+    if plan["Node Type"] == "Seq Scan":
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+def test_repository_queries_use_indexes(session: Session) -> None:
+    calls = repository_calls(session)
+    connection = session.connection()
+    statements: list[tuple[str, Any]] = []
+
+    def record(_conn, _cursor, statement, parameters, _context, executemany) -> None:
+        if not executemany:
+            statements.append((statement, parameters))
+
+    event.listen(connection, "before_cursor_execute", record)
+    try:
+        for call in calls:
+            call()
+    finally:
+        event.remove(connection, "before_cursor_execute", record)
+
+    scans = {}
+    for statement, parameters in statements:
+        if statement.lstrip().upper().startswith(("SAVEPOINT", "RELEASE", "ROLLBACK")):
+            continue
+        (plan,) = connection.exec_driver_sql(
+            f"EXPLAIN (FORMAT JSON) {statement}", parameters
+        ).scalar()
+        if tables := seq_scans(plan["Plan"]):
+            scans[statement] = tables
+    assert not scans
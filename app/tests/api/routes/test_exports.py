@@ -0,0 +1,28 @@
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+
+
+def test_export_streams_csv(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    response = client.get(
+        f"{settings.API_V1_STR}/exports/transactions",
+        headers=superuser_token_headers,
+        params={"since": "2100-01-01T00:00:00"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    # Only the header row is left after the filter
+    assert response.text.splitlines() == [
+        "id,created_at,updated_at,status,type,amount,wallet_id,user_id,currency_id"
+    ]
+
+
+def test_export_requires_superuser(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    response = client.get(
+        f"{settings.API_V1_STR}/exports/purchases", headers=normal_user_token_headers
+    )
+    assert response.status_code == 403
@@ -1,9 +1,211 @@
-from unittest.mock import patch
+import base64
+import uuid
+from decimal import Decimal
+from unittest.mock import AsyncMock, patch
 
+import pytest
 from fastapi.testclient import TestClient
+from sqlmodel import Session, select
 
+from app.adapters import AsyncIdempotencyKeyRepository
+from app.core.config import settings
+from app.core.db import engine
+from app.models import Market, Purchase, PurchaseStatus, User, Wallet
+from app.worker.purchase_finalizer import finalize_batch
 
-def test_purchase_lower_ten(
+MARKET = settings.BASE_CURRENCY_SYMBOL + settings.QOUTE_CURRENCY_SYMBOL
+
+
+@pytest.fixture
+def market(db: Session) -> Market:
+    return db.exec(select(Market).where(Market.symbol == MARKET)).one()
+
+
+@pytest.fixture
+def wallets(db: Session, superuser: User, market: Market) -> dict[str, Wallet]:
+    """
+    The superuser's base and qoute wallets, reset to 20 each with nothing
+    locked.
+    """
+    wallets = {
+        name: db.exec(
+            select(Wallet)
+            .where(Wallet.user_id == superuser.id)
+            .where(Wallet.currency_id == currency_id)
+        ).one()
+        for name, currency_id in (
+            ("base", market.base_currency_id),
+            ("qoute", market.qoute_currency_id),
+        )
+    }
+    for wallet in wallets.values():
+        wallet.balance = Decimal(20)
+        wallet.locked = Decimal(0)
+        db.add(wallet)
+    db.commit()
+    return wallets
+
+
+def refreshed(db: Session, wallet: Wallet) -> Wallet:
+    db.refresh(wallet)
+    return wallet
+
+
+def test_purchase_batch_reports_each_outcome(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    wallets: dict[str, Wallet],
+) -> None:
+    response = client.post(
+        f"{settings.API_V1_STR}/purchases/batch",
+        headers=superuser_token_headers,
+        json=[
+            {"market": MARKET, "amount": "1"},
+            {"market": "MISSING", "amount": "1"},
+            {"market": MARKET, "amount": "100"},
+            {"market": MARKET, "amount": "2"},
+        ],
+    )
+    assert response.status_code == 200
+    results = response.json()["data"]
+    assert [result["status"] for result in results] == [
+        "DONE",
+        "FAILED",
+        "FAILED",
+        "DONE",
+    ]
+    assert results[1]["detail"] == "Market not found"
+    assert results[2]["detail"] == "Not enough credit"
+    # Price 4: 3 bought for 12
+    assert refreshed(db, wallets["base"]).balance == Decimal(23)
+    assert refreshed(db, wallets["qoute"]).balance == Decimal(8)
+
+
+def test_atomic_purchase(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    wallets: dict[str, Wallet],
+) -> None:
+    with patch.object(settings, "PURCHASE_EXECUTION_MODE", "atomic"):
+        response = client.post(
+            f"{settings.API_V1_STR}/purchases/",
+            headers=superuser_token_headers,
+            json={"market": MARKET, "amount": "2"},
+        )
+    assert response.status_code == 200
+    assert response.json()["status"] == "DONE"
+    purchase = db.get(Purchase, response.json()["id"])
+    assert purchase and purchase.price == Decimal(8)
+    assert refreshed(db, wallets["base"]).balance == Decimal(22)
+    assert refreshed(db, wallets["qoute"]).balance == Decimal(12)
+
+
+def test_atomic_purchase_without_credit(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    wallets: dict[str, Wallet],
+) -> None:
+    with patch.object(settings, "PURCHASE_EXECUTION_MODE", "atomic"):
+        response = client.post(
+            f"{settings.API_V1_STR}/purchases/",
+            headers=superuser_token_headers,
+            json={"market": MARKET, "amount": "6"},
+        )
+    assert response.status_code == 422
+    assert response.json()["detail"] == "Not enough credit"
+    assert refreshed(db, wallets["base"]).balance == Decimal(20)
+    assert refreshed(db, wallets["qoute"]).balance == Decimal(20)
+
+
+def test_queued_purchase_is_finalized(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    wallets: dict[str, Wallet],
+) -> None:
+    with patch.object(settings, "PURCHASE_EXECUTION_MODE", "queued"):
+        response = client.post(
+            f"{settings.API_V1_STR}/purchases/",
+            headers=superuser_token_headers,
+            json={"market": MARKET, "amount": "2"},
+        )
+    assert response.status_code == 202
+    assert response.json()["status"] == "PENDING"
+    qoute_wallet = refreshed(db, wallets["qoute"])
+    assert (qoute_wallet.balance, qoute_wallet.locked) == (Decimal(20), Decimal(8))
+
+    with Session(engine) as session:
+        assert finalize_batch(session, 100) >= 1
+    purchase = db.get(Purchase, response.json()["id"])
+    assert purchase
+    db.refresh(purchase)
+    assert purchase.status == PurchaseStatus.DONE
+    qoute_wallet = refreshed(db, wallets["qoute"])
+    assert (qoute_wallet.balance, qoute_wallet.locked) == (Decimal(12), Decimal(0))
+    assert refreshed(db, wallets["base"]).balance == Decimal(22)
+
+
+def test_idempotent_purchase_replay(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    wallets: dict[str, Wallet],
+) -> None:
+    headers = {**superuser_token_headers, "Idempotency-Key": str(uuid.uuid4())}
+    responses = [
+        client.post(
+            f"{settings.API_V1_STR}/purchases/",
+            headers=headers,
+            json={"market": MARKET, "amount": "1"},
+        )
+        for _ in range(2)
+    ]
+    assert [response.status_code for response in responses] == [200, 200]
+    assert responses[0].json()["id"] == responses[1].json()["id"]
+    # Only the first request bought anything
+    assert refreshed(db, wallets["qoute"]).balance == Decimal(16)
+
+    response = client.post(
+        f"{settings.API_V1_STR}/purchases/",
+        headers=headers,
+        json={"market": MARKET, "amount": "2"},
+    )
+    assert response.status_code == 422
+
+
+def test_idempotency_key_lost_race_without_purchase(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    wallets: dict[str, Wallet],
+) -> None:
+    headers = {**superuser_token_headers, "Idempotency-Key": str(uuid.uuid4())}
+    with (
+        patch.object(
+            AsyncIdempotencyKeyRepository, "claim", AsyncMock(return_value=False)
+        ),
+        patch.object(
+            AsyncIdempotencyKeyRepository, "get_purchase", AsyncMock(return_value=None)
+        ),
+    ):
+        response = client.post(
+            f"{settings.API_V1_STR}/purchases/",
+            headers=headers,
+            json={"market": MARKET, "amount": "1"},
+        )
+    assert response.status_code == 409
+    assert refreshed(db, wallets["qoute"]).balance == Decimal(20)
+
+
+def test_purchase_history_rejects_malformed_cursor(
     client: TestClient, superuser_token_headers: dict[str, str]
 ) -> None:
-    pass
+    response = client.get(
+        f"{settings.API_V1_STR}/purchases/",
+        headers=superuser_token_headers,
+        params={"cursor": base64.urlsafe_b64encode(b"[1, 2]").decode()},
+    )
+    assert response.status_code == 400
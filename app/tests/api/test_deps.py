@@ -0,0 +1,29 @@
+import time
+import uuid
+
+from sqlmodel import Session, func, select
+
+from app.api.deps import (
+    USER_INVALIDATION_CHANNEL,
+    user_cache,
+    user_invalidation_listener,
+)
+from app.models import User
+
+
+def test_invalidation_from_another_process_evicts_user(db: Session) -> None:
+    user_id = str(uuid.uuid4())
+    listener = user_invalidation_listener(db.get_bind())
+    listener.start()
+    try:
+        # Give the listener time to connect, on_connect clears the cache
+        time.sleep(1)
+        user_cache.set(user_id, User(full_name="cached", hashed_password=""))
+        db.execute(select(func.pg_notify(USER_INVALIDATION_CHANNEL, user_id)))
+        db.commit()
+        deadline = time.monotonic() + 5
+        while user_cache.get(user_id) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert user_cache.get(user_id) is None
+    finally:
+        listener.stop()
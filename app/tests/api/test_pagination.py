@@ -0,0 +1,44 @@
+import base64
+import json
+import uuid
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlmodel import Session, func, select
+
+from app.api.pagination import approximate_count, decode_cursor, encode_cursor
+from app.models import User
+
+
+def test_cursor_round_trip() -> None:
+    user_id = uuid.uuid4()
+    assert decode_cursor(encode_cursor(user_id), 1) == [str(user_id)]
+
+
+def test_invalid_cursor_is_rejected() -> None:
+    with pytest.raises(HTTPException):
+        decode_cursor("not-a-cursor", 1)
+
+
+def test_cursor_of_non_strings_is_rejected() -> None:
+    cursor = base64.urlsafe_b64encode(json.dumps([1, 2]).encode()).decode()
+    with pytest.raises(HTTPException):
+        decode_cursor(cursor, 2)
+
+
+def test_approximate_count_of_never_analyzed_table(db: Session) -> None:
+    # What pg_class holds for a table never analyzed before PG 14
+    with db.get_bind().connect() as connection:
+        transaction = connection.begin()
+        connection.execute(
+            text(
+                "UPDATE pg_class SET reltuples = 0, relpages = 0 "
+                "WHERE oid = 'users'::regclass"
+            )
+        )
+        with Session(bind=connection) as session:
+            count = session.exec(select(func.count()).select_from(User)).one()
+            assert count > 0
+            assert approximate_count(session, User) == count
+        transaction.rollback()
@@ -2,30 +2,35 @@ from collections.abc import Generator
 
 import pytest
 from fastapi.testclient import TestClient
-from sqlmodel import Session, delete
+from sqlalchemy.exc import DBAPIError
+from sqlmodel import Session, delete, select
 
 from app.core.config import settings
 from app.core.db import engine, init_db
 from app.main import app
-from app.models import Item, User
+from app.models import User
 from app.tests.utils.user import authentication_token_from_email
 from app.tests.utils.utils import get_superuser_token_headers
 
 
-@pytest.fixture(scope="session", autouse=True)
+@pytest.fixture(scope="session")
 def db() -> Generator[Session, None, None]:
+    # Tests that need Postgres skip without a migrated database to run on
+    try:
+        with engine.connect() as connection:
+            connection.exec_driver_sql("SELECT 1 FROM users LIMIT 1")
+    except DBAPIError:
+        pytest.skip("No migrated Postgres database available")
     with Session(engine) as session:
         init_db(session)
         yield session
-        statement = delete(Item)
-        session.execute(statement)
         statement = delete(User)
         session.execute(statement)
         session.commit()
 
 
 @pytest.fixture(scope="module")
-def client() -> Generator[TestClient, None, None]:
+def client(db: Session) -> Generator[TestClient, None, None]:  # noqa: ARG001
     with TestClient(app) as c:
         yield c
 
@@ -35,6 +40,11 @@ def superuser_token_headers(client: TestClient) -> dict[str, str]:
     return get_superuser_token_headers(client)
 
 
+@pytest.fixture(scope="module")
+def superuser(db: Session) -> User:
+    return db.exec(select(User).where(User.email == settings.FIRST_SUPERUSER)).one()
+
+
 @pytest.fixture(scope="module")
 def normal_user_token_headers(client: TestClient, db: Session) -> dict[str, str]:
     return authentication_token_from_email(
@@ -0,0 +1,46 @@
+from decimal import Decimal
+
+from app.models import OrderSide
+from app.service.order_book import BookOrder, Fill, OrderBook
+
+
+def order(
+    order_id: str, side: OrderSide, price: str, amount: str, sequence: int
+) -> BookOrder:
+    return BookOrder(
+        order_id, side, Decimal(price), Decimal(amount), sequence, received_at=0.0
+    )
+
+
+def test_matches_best_price_then_oldest() -> None:
+    book = OrderBook()
+    book.submit(order("s1", OrderSide.SELL, "101", "1", 1))
+    book.submit(order("s2", OrderSide.SELL, "100", "1", 2))
+    book.submit(order("s3", OrderSide.SELL, "100", "1", 3))
+    fills = book.submit(order("b1", OrderSide.BUY, "101", "2.5", 4))
+    assert fills == [
+        Fill("b1", "s2", Decimal("100"), Decimal("1")),
+        Fill("b1", "s3", Decimal("100"), Decimal("1")),
+        Fill("b1", "s1", Decimal("101"), Decimal("0.5")),
+    ]
+    assert [o["order_id"] for o in book.snapshot()] == ["s1"]
+
+
+def test_rests_unmatched_amount_and_expires_it() -> None:
+    book = OrderBook()
+    assert book.submit(order("s1", OrderSide.SELL, "100", "1", 1)) == []
+    book.submit(order("b1", OrderSide.BUY, "99", "2", 2))
+    assert len(book) == 2
+    expired = book.expire(OrderSide.BUY, received_before=1.0)
+    assert [o.order_id for o in expired] == ["b1"]
+    assert len(book) == 1
+
+
+def test_restores_from_snapshot() -> None:
+    book = OrderBook()
+    book.submit(order("s1", OrderSide.SELL, "100", "1", 1))
+    book.submit(order("b1", OrderSide.BUY, "99", "1", 2))
+    restored = OrderBook.restore(book.snapshot())
+    assert restored.snapshot() == book.snapshot()
+    fills = restored.submit(order("b2", OrderSide.BUY, "100", "1", 3))
+    assert fills == [Fill("b2", "s1", Decimal("100"), Decimal("1"))]
@@ -0,0 +1,52 @@
+import json
+from decimal import Decimal
+from unittest.mock import patch
+
+import psycopg
+from sqlmodel import Session, select
+
+from app.adapters.events import PURCHASE_EVENTS_CHANNEL
+from app.models import Market, Purchase, PurchaseStatus, SettlementOutbox, User
+from app.worker.outbox_relay import relay_batch
+
+
+def test_relay_announces_relayed_purchases(db: Session, superuser: User) -> None:
+    market = db.exec(select(Market)).first()
+    assert market
+    purchase = Purchase(
+        status=PurchaseStatus.DONE,
+        amount=Decimal(1),
+        price=market.price,
+        user_id=superuser.id,
+        market_id=market.id,
+    )
+    db.add(purchase)
+    db.flush()
+    db.add(SettlementOutbox(purchase_id=purchase.id, market_id=market.id))
+    db.commit()
+
+    engine = db.get_bind()
+    conninfo = engine.url.set(drivername="postgresql").render_as_string(
+        hide_password=False
+    )
+    with psycopg.connect(conninfo, autocommit=True) as listener:
+        listener.execute(f"LISTEN {PURCHASE_EVENTS_CHANNEL}")
+        with (
+            patch("app.worker.outbox_relay.settle_purchases") as settle_purchases,
+            Session(engine) as session,
+        ):
+            while relay_batch(session, 100):
+                pass
+        events = [
+            event
+            for notify in listener.notifies(timeout=1)
+            for event in json.loads(notify.payload)
+        ]
+    assert settle_purchases.delay.called
+    assert {
+        "purchase_id": str(purchase.id),
+        "user_id": str(superuser.id),
+        "status": PurchaseStatus.DONE,
+    }.items() <= next(
+        event for event in events if event["purchase_id"] == str(purchase.id)
+    ).items()
@@ -0,0 +1,51 @@
+from unittest.mock import MagicMock, patch
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.worker.celery import dead_letter_queue, settlement_queue
+from app.worker.settlement_consumer import settle_message
+
+TASK = "app.worker.tasks.settle_purchases"
+
+
+def poison_message(retries: int) -> MagicMock:
+    message = MagicMock()
+    message.headers = {"id": "poison", "task": TASK, "retries": retries}
+    message.decode.return_value = ([], {"market": 1, "purchases": ["nope"]}, {})
+    return message
+
+
+def test_failed_message_is_published_again(db: Session) -> None:  # noqa: ARG001
+    message = poison_message(retries=1)
+    with patch("app.worker.settlement_consumer.app.send_task") as send_task:
+        settle_message(message)
+    send_task.assert_called_once_with(
+        TASK,
+        args=[],
+        kwargs={"market": 1, "purchases": ["nope"]},
+        queue=settlement_queue.name,
+        retries=2,
+    )
+    message.ack.assert_called_once()
+    message.requeue.assert_not_called()
+
+
+def test_message_out_of_retries_is_dead_lettered(db: Session) -> None:  # noqa: ARG001
+    message = poison_message(retries=settings.SETTLEMENT_MAX_RETRIES)
+    with patch("app.worker.settlement_consumer.app.send_task") as send_task:
+        settle_message(message)
+    send_task.assert_called_once()
+    assert send_task.call_args.kwargs["queue"] == dead_letter_queue.name
+    message.ack.assert_called_once()
+
+
+def test_undecodable_message_is_rejected() -> None:
+    message = MagicMock()
+    message.headers = {"id": "garbage", "task": TASK}
+    message.decode.side_effect = ValueError("not json")
+    with patch("app.worker.settlement_consumer.app.send_task") as send_task:
+        settle_message(message)
+    send_task.assert_not_called()
+    message.reject.assert_called_once()
+    message.ack.assert_not_called()
@@ -0,0 +1,135 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+from sqlmodel import Session, select
+
+from app.adapters import SettlementRepository
+from app.models import (
+    Market,
+    Purchase,
+    PurchaseStatus,
+    Transaction,
+    TransactionStatus,
+    TransactionType,
+    User,
+    Wallet,
+    WalletReconciliation,
+)
+from app.tests.utils.user import create_random_user
+from app.worker.tasks import reconcile_wallet_range, settle_unsettled
+
+
+def test_settling_a_purchase_twice_adds_it_once(db: Session, superuser: User) -> None:
+    market = db.exec(select(Market)).first()
+    assert market
+    purchase = Purchase(
+        status=PurchaseStatus.DONE,
+        amount=Decimal("0.5"),
+        price=Decimal(2),
+        user_id=superuser.id,
+        market_id=market.id,
+    )
+    db.add(purchase)
+    db.commit()
+    settlements = SettlementRepository()
+    before = settlements.get_active_amount(db, market.id)
+
+    # A redelivered message carries the same purchase again
+    assert settle_unsettled(db, market, [str(purchase.id)]) == 1
+    assert settle_unsettled(db, market, [str(purchase.id)]) == 0
+
+    assert settlements.get_active_amount(db, market.id) == before + Decimal("0.5")
+    db.refresh(purchase)
+    assert purchase.settled_at is not None
+
+
+@pytest.fixture
+def wallet(db: Session) -> Wallet:
+    """
+    A fresh wallet holding 5, funded through the ledger.
+    """
+    market = db.exec(select(Market)).first()
+    assert market
+    wallet = Wallet(
+        name="test",
+        balance=Decimal(5),
+        active=True,
+        currency_id=market.qoute_currency_id,
+        user_id=create_random_user(db).id,
+    )
+    db.add(wallet)
+    # No relationship orders the inserts, the wallet has to exist first
+    db.flush()
+    db.add(
+        Transaction(
+            amount=Decimal(5),
+            status=TransactionStatus.DONE,
+            type=TransactionType.CREDIT,
+            wallet_id=wallet.id,
+        )
+    )
+    db.commit()
+    return wallet
+
+
+def reconcile(wallet: Wallet) -> int:
+    return reconcile_wallet_range.apply(
+        kwargs={
+            "start": str(wallet.id),
+            "end": str(wallet.id),
+            "watermark": datetime.now(timezone.utc).isoformat(),
+        }
+    ).get()
+
+
+def add_to_balance(db: Session, wallet: Wallet, amount: Decimal) -> None:
+    # Behind the ledger's back
+    db.refresh(wallet)
+    wallet.balance += amount
+    db.add(wallet)
+    db.commit()
+
+
+def checkpoint_drift(db: Session, wallet: Wallet) -> Decimal:
+    checkpoint = db.get(WalletReconciliation, wallet.id)
+    assert checkpoint
+    db.refresh(checkpoint)
+    return checkpoint.drift
+
+
+def test_reconciliation_checks_new_wallets_against_their_ledger(
+    db: Session, wallet: Wallet
+) -> None:
+    assert reconcile(wallet) == 0
+    assert checkpoint_drift(db, wallet) == Decimal(0)
+
+
+def test_first_reconciliation_reports_existing_drift(
+    db: Session, wallet: Wallet
+) -> None:
+    add_to_balance(db, wallet, Decimal(3))
+    assert reconcile(wallet) == 1
+    assert checkpoint_drift(db, wallet) == Decimal(3)
+    # The checkpoint carries the drift from then on
+    assert reconcile(wallet) == 0
+
+
+def test_reconciliation_reports_drift_since_checkpoint(
+    db: Session, wallet: Wallet
+) -> None:
+    assert reconcile(wallet) == 0
+    db.add(
+        Transaction(
+            amount=Decimal(2),
+            status=TransactionStatus.DONE,
+            type=TransactionType.DEBT,
+            wallet_id=wallet.id,
+        )
+    )
+    add_to_balance(db, wallet, Decimal(-2))
+    assert reconcile(wallet) == 0
+
+    add_to_balance(db, wallet, Decimal(5))
+    assert reconcile(wallet) == 1
+    assert checkpoint_drift(db, wallet) == Decimal(5)
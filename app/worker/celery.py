@@ -1,20 +1,129 @@
 from logging import getLogger
+from typing import NoReturn
 from celery import Celery
 from celery import Task
+from celery.schedules import crontab
+from celery.signals import worker_process_init, worker_process_shutdown
+from kombu import Exchange, Queue
 
+from sqlalchemy import Engine
+from sqlalchemy.exc import DBAPIError
+from app.adapters import exchange_client, market_catalog
 from app.core.config import settings
-from app.core.db import engine
+from app.core.db import create_db_engine, engine
+from app.core.metrics import metrics
+from app.core.retry import backoff_delay, retryable_reason
 from sqlmodel import Session
 
 logger = getLogger(__name__)
 
+# Created in each pool child after the fork, see init_worker_process
+worker_engine: Engine | None = None
+
+
+def get_worker_engine() -> Engine:
+    # Solo/thread pools never fork and just use the module engine
+    return worker_engine or engine
+
 
 class CustomTask(Task):
-    _db: Session = None
-        
+    """
+    Gives every task a session that lives as long as the worker process. It
+    is closed after each task, which returns its connection to the pool and
+    drops any leftover state before the next task reuses it.
+    """
+
+    _db: Session | None = None
+
+    @property
+    def db(self) -> Session:
+        if self._db is None:
+            self._db = Session(get_worker_engine())
+        return self._db
+
+    def after_return(self, *args, **kwargs) -> None:
+        if self._db is not None:
+            self._db.close()
+
+    def retry_or_dead_letter(self, exc: DBAPIError) -> NoReturn:
+        """
+        Schedules the task again with exponential backoff and jitter after a
+        deadlock, serialization failure or lock timeout. Other errors, and
+        tasks that ran out of retries, are parked on the dead letter queue.
+        """
+        reason = retryable_reason(exc)
+        if reason and self.request.retries < self.max_retries:
+            metrics.incr(f"{self.name}.retries")
+            metrics.incr(f"{self.name}.{reason}")
+            raise self.retry(exc=exc, countdown=backoff_delay(self.request.retries))
+        self.dead_letter(exc)
+        raise exc
+
+    def dead_letter(self, exc: BaseException) -> None:
+        metrics.incr(f"{self.name}.dead_lettered")
+        logger.error("Dead lettering %s %s: %r", self.name, self.request.id, exc)
+        self.apply_async(
+            args=self.request.args,
+            kwargs=self.request.kwargs,
+            queue=dead_letter_queue.name,
+            headers={"x-dead-letter-reason": repr(exc)},
+        )
 
 
 app = Celery(__name__, task_cls="app.worker.celery.CustomTask")
 app.conf.broker_url = settings.CELERY_BROKER_URL
+app.conf.beat_schedule = {
+    "purge-idempotency-keys": {
+        "task": "app.worker.tasks.purge_idempotency_keys",
+        "schedule": settings.IDEMPOTENCY_KEY_PURGE_INTERVAL_SECONDS,
+    },
+    "resend-settlement-orders": {
+        "task": "app.worker.tasks.resend_settlement_orders",
+        "schedule": settings.SETTLEMENT_RESEND_INTERVAL_SECONDS,
+    },
+    "reconcile-balances": {
+        "task": "app.worker.tasks.reconcile_balances",
+        "schedule": crontab(hour=settings.RECONCILIATION_HOUR, minute=0),
+    },
+}
+
+# Settlement tasks are drained in batches by app.worker.settlement_consumer
+settlement_queue = Queue(
+    "settlements", Exchange("settlements"), routing_key="settlements"
+)
+# Nothing consumes this queue, messages wait there to be inspected and replayed
+dead_letter_queue = Queue(
+    "dead_letter", Exchange("dead_letter"), routing_key="dead_letter"
+)
+if settings.SETTLEMENT_BATCHING:
+    app.conf.task_routes = {
+        "app.worker.tasks.settle_purchase": {"queue": settlement_queue.name},
+        "app.worker.tasks.settle_purchases": {"queue": settlement_queue.name},
+    }
 
 app.autodiscover_tasks(packages=["app.worker"], related_name="tasks")
+
+
+@worker_process_init.connect
+def init_worker_process(**_kwargs) -> None:
+    global worker_engine
+    # Pooled connections inherited from the parent belong to it, forget them
+    # without closing so the parent's sockets stay intact
+    engine.dispose(close=False)
+    worker_engine = create_db_engine(
+        settings.WORKER_DB_POOL_SIZE,
+        settings.WORKER_DB_MAX_OVERFLOW,
+        settings.WORKER_DB_LOCK_TIMEOUT_MS,
+        settings.WORKER_DB_STATEMENT_TIMEOUT_MS,
+        name="worker",
+    )
+    # Listener threads don't survive fork, so every pool child starts its own
+    market_catalog.start(worker_engine)
+
+
+@worker_process_shutdown.connect
+def shutdown_worker_process(**_kwargs) -> None:
+    market_catalog.stop()
+    exchange_client.close()
+    if worker_engine is not None:
+        worker_engine.dispose()
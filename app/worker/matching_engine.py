@@ -0,0 +1,192 @@
+import logging
+import signal
+import threading
+import time
+import uuid
+from collections import defaultdict
+from decimal import Decimal
+
+from sqlmodel import Session
+
+from app.adapters import (
+    OrderBookRepository,
+    PurchaseRepository,
+    SettlementOutboxRepository,
+    publish_purchase_events,
+)
+from app.core.config import settings
+from app.core.db import engine
+from app.core.metrics import metrics
+from app.models import OrderSide
+from app.service import BookOrder, OrderBook
+from app.worker.tasks import (
+    add_settlement_amounts,
+    get_market,
+    settlement_stripe,
+    try_merge_settlements,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+stop = threading.Event()
+
+
+class MatchingEngine:
+    """
+    Crosses the exchange cover of opposite purchases on the same market
+    inside per-market order books, so only the net imbalance reaches the
+    settlement stripes.
+
+    Buys rest for MATCHING_REST_MS waiting for a seller and are then sent to
+    settlement. Sells rest until a buy takes them, there is no way to sell
+    on the exchange. Outbox rows, settlement amounts and book snapshots are
+    committed together, so a restarted engine resumes from its snapshots and
+    replays whatever is still in the outbox.
+    """
+
+    def __init__(self) -> None:
+        self.books: dict[int, OrderBook] = {}
+
+    def load(self, session: Session) -> None:
+        self.books = {
+            market_id: OrderBook.restore(orders)
+            for market_id, orders in OrderBookRepository()
+            .get_snapshots(session)
+            .items()
+        }
+        logger.info(
+            "Restored %s resting orders in %s books",
+            sum(len(book) for book in self.books.values()),
+            len(self.books),
+        )
+
+    def book(self, market_id: int) -> OrderBook:
+        if market_id not in self.books:
+            self.books[market_id] = OrderBook()
+        return self.books[market_id]
+
+    def match_batch(self, session: Session, limit: int) -> int:
+        """
+        Feeds up to `limit` outbox rows to the books in outbox order, then
+        moves buys that rested too long into the settlement stripes.
+        """
+        outbox_repository = SettlementOutboxRepository()
+        entries = outbox_repository.lock_batch(session, limit)
+        purchases = {
+            purchase.id: purchase
+            for purchase in PurchaseRepository().get_by_ids(
+                session, [str(entry.purchase_id) for entry in entries]
+            )
+        }
+        now = time.time()
+        touched: set[int] = set()
+        crossed = Decimal(0)
+        for entry in entries:
+            purchase = purchases.get(entry.purchase_id)
+            if not purchase or not purchase.amount:
+                continue
+            order = BookOrder(
+                order_id=str(purchase.id),
+                side=entry.side,
+                # Purchases store the total, the book works in unit prices
+                price=purchase.price / purchase.amount,
+                amount=purchase.amount,
+                sequence=entry.id,
+                received_at=now,
+            )
+            fills = self.book(entry.market_id).submit(order)
+            crossed += sum((fill.amount for fill in fills), Decimal(0))
+            touched.add(entry.market_id)
+
+        received_before = now - settings.MATCHING_REST_MS / 1000
+        imbalance: dict[int, dict[int, Decimal]] = {}
+        for market_id in sorted(self.books):
+            expired = self.books[market_id].expire(OrderSide.BUY, received_before)
+            if not expired:
+                continue
+            amounts: dict[int, Decimal] = defaultdict(Decimal)
+            for order in expired:
+                amounts[settlement_stripe(uuid.UUID(order.order_id))] += order.amount
+            imbalance[market_id] = amounts
+            touched.add(market_id)
+
+        markets = {market_id: get_market(session, market_id) for market_id in imbalance}
+        for market_id, amounts in imbalance.items():
+            add_settlement_amounts(session, markets[market_id], amounts)
+        # The outbox is the purchase event stream's only source
+        publish_purchase_events(session, purchases.values())
+        outbox_repository.delete_many(session, [entry.id for entry in entries])
+        OrderBookRepository().save_snapshots(
+            session,
+            {market_id: self.books[market_id].snapshot() for market_id in touched},
+        )
+        session.commit()
+        metrics.incr("matching.orders", len(entries))
+        metrics.observe("matching.crossed", float(crossed))
+        for market in markets.values():
+            try_merge_settlements(session, market)
+        return len(entries)
+
+
+def holds_lock(lock_session: Session) -> bool:
+    try:
+        held = OrderBookRepository().holds_writer_lock(lock_session)
+        lock_session.rollback()
+        return held
+    except Exception:
+        logger.exception("Matching engine lock check failed")
+        return False
+
+
+def run() -> None:
+    if not settings.SETTLEMENT_MATCHING:
+        # The relay is the outbox's only consumer
+        logger.info("Settlement matching is off, the matching engine stays idle")
+        stop.wait()
+        return
+    interval = settings.MATCHING_INTERVAL_MS / 1000
+    matching_engine = MatchingEngine()
+    # The writer lock is held by a connection kept checked out for the whole
+    # run, it needs a direct or session pooled connection to Postgres
+    with engine.connect() as connection:
+        lock_session = Session(bind=connection)
+        while not OrderBookRepository().try_lock_writer(lock_session):
+            lock_session.rollback()
+            logger.info("Another matching engine is running, waiting")
+            if stop.wait(settings.MATCHING_LOCK_RETRY_SECONDS):
+                return
+        lock_session.commit()
+        with Session(engine) as session:
+            matching_engine.load(session)
+        while not stop.is_set():
+            # Another engine may have taken over if the lock went with a
+            # dropped connection, exit and compete for it again on restart
+            if not holds_lock(lock_session):
+                logger.error("Lost the matching engine lock, stopping")
+                return
+            try:
+                with Session(engine) as session:
+                    count = matching_engine.match_batch(
+                        session, settings.MATCHING_BATCH_SIZE
+                    )
+            except Exception:
+                logger.exception("Matching pass failed")
+                count = 0
+                # The books may be ahead of the rolled back transaction
+                with Session(engine) as session:
+                    matching_engine.load(session)
+            if count < settings.MATCHING_BATCH_SIZE:
+                stop.wait(interval)
+
+
+def main() -> None:
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    logger.info("Starting matching engine")
+    run()
+    logger.info("Matching engine stopped")
+
+
+if __name__ == "__main__":
+    main()
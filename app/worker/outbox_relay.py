@@ -0,0 +1,80 @@
+import logging
+import signal
+import threading
+from collections import defaultdict
+
+from sqlmodel import Session
+
+from app.adapters import (
+    PurchaseRepository,
+    SettlementOutboxRepository,
+    publish_purchase_events,
+)
+from app.core.config import settings
+from app.core.db import engine
+from app.worker.tasks import settle_purchases
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+stop = threading.Event()
+
+
+def relay_batch(session: Session, limit: int) -> int:
+    """
+    Publishes up to `limit` outbox rows as one settle_purchases message per
+    market, announces the purchases on the event stream and deletes the rows
+    in the same transaction. Purchase transactions never NOTIFY themselves,
+    so they don't queue on Postgres' notification lock.
+
+    Delivery is at least once: if the commit fails after publishing, the rows
+    are published again by the next pass. Settling is idempotent per
+    purchase, so the duplicate messages change nothing.
+    """
+    outbox_repository = SettlementOutboxRepository()
+    entries = outbox_repository.lock_batch(session, limit)
+    by_market: dict[int, list[str]] = defaultdict(list)
+    for entry in entries:
+        by_market[entry.market_id].append(str(entry.purchase_id))
+    for market_id, purchase_ids in by_market.items():
+        settle_purchases.delay(market=market_id, purchases=purchase_ids)
+    if entries:
+        publish_purchase_events(
+            session,
+            PurchaseRepository().get_by_ids(
+                session, [str(entry.purchase_id) for entry in entries]
+            ),
+        )
+    outbox_repository.delete_many(session, [entry.id for entry in entries])
+    session.commit()
+    return len(entries)
+
+
+def run() -> None:
+    if settings.SETTLEMENT_MATCHING:
+        # The matching engine is the outbox's only consumer
+        logger.info("Settlement matching is on, the relay stays idle")
+        stop.wait()
+        return
+    while not stop.is_set():
+        try:
+            with Session(engine) as session:
+                count = relay_batch(session, settings.OUTBOX_RELAY_BATCH_SIZE)
+        except Exception:
+            logger.exception("Outbox relay pass failed")
+            count = 0
+        # A full batch means there is more waiting, so go again right away
+        if count < settings.OUTBOX_RELAY_BATCH_SIZE:
+            stop.wait(settings.OUTBOX_RELAY_POLL_INTERVAL_SECONDS)
+
+
+def main() -> None:
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    logger.info("Starting settlement outbox relay")
+    run()
+    logger.info("Settlement outbox relay stopped")
+
+
+if __name__ == "__main__":
+    main()
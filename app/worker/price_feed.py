@@ -0,0 +1,166 @@
+import abc
+import json
+import logging
+import signal
+import socket
+import threading
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+from urllib.parse import urlsplit
+
+from sqlmodel import Session
+
+from app.adapters import MarketRepository, market_catalog, publish_prices
+from app.core.config import settings
+from app.core.db import engine
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+stop = threading.Event()
+
+
+@dataclass(frozen=True)
+class PriceTick:
+    symbol: str
+    price: Decimal
+
+
+def parse_tick(line: str | bytes) -> PriceTick | None:
+    try:
+        data = json.loads(line)
+        return PriceTick(symbol=data["symbol"], price=Decimal(str(data["price"])))
+    except (ValueError, KeyError, TypeError, InvalidOperation):
+        logger.warning("Dropping malformed tick %r", line)
+        return None
+
+
+class PriceSource(abc.ABC):
+    """
+    Yields ticks as they arrive, and None whenever `timeout` passes without
+    one so the caller can flush on time.
+    """
+
+    @abc.abstractmethod
+    def ticks(self, timeout: float) -> Iterator[PriceTick | None]: ...
+
+
+class UdpPriceSource(PriceSource):
+    """
+    One JSON tick, {"symbol": ..., "price": ...}, per datagram.
+    """
+
+    def __init__(self, host: str, port: int) -> None:
+        self.host = host
+        self.port = port
+
+    def ticks(self, timeout: float) -> Iterator[PriceTick | None]:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.bind((self.host, self.port))
+            sock.settimeout(timeout)
+            while True:
+                try:
+                    data, _ = sock.recvfrom(65536)
+                except TimeoutError:
+                    yield None
+                    continue
+                yield parse_tick(data)
+
+
+class FilePriceSource(PriceSource):
+    """
+    Follows a JSON lines file like `tail -f`, one tick per line.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def ticks(self, timeout: float) -> Iterator[PriceTick | None]:
+        with open(self.path) as file:
+            while True:
+                line = file.readline()
+                if not line:
+                    time.sleep(timeout)
+                    yield None
+                elif line.strip():
+                    yield parse_tick(line)
+
+
+def price_source(url: str) -> PriceSource:
+    parts = urlsplit(url)
+    if parts.scheme == "udp":
+        return UdpPriceSource(parts.hostname or "0.0.0.0", parts.port or 9200)
+    if parts.scheme == "file":
+        return FilePriceSource(parts.path)
+    raise ValueError(f"Unsupported price feed {url}")
+
+
+class PriceFeed:
+    """
+    Coalesces ticks to the latest price per market. Every publish interval
+    the changed prices are broadcast to all processes with one NOTIFY, and
+    every persist interval they are written to markets with one UPDATE.
+    """
+
+    def __init__(self, publish_interval: float, persist_interval: float) -> None:
+        self.publish_interval = publish_interval
+        self.persist_interval = persist_interval
+        self._unpublished: dict[int, Decimal] = {}
+        self._unpersisted: dict[int, Decimal] = {}
+        self._published_at = time.monotonic()
+        self._persisted_at = time.monotonic()
+
+    def add(self, tick: PriceTick) -> None:
+        market = market_catalog.get_by_symbol(tick.symbol)
+        if not market:
+            logger.debug("Dropping tick for unknown market %s", tick.symbol)
+            return
+        self._unpublished[market.id] = tick.price
+        self._unpersisted[market.id] = tick.price
+
+    def flush(self, session: Session, force: bool = False) -> None:
+        now = time.monotonic()
+        publish_due = now - self._published_at >= self.publish_interval
+        if self._unpublished and (force or publish_due):
+            publish_prices(session, self._unpublished)
+            session.commit()
+            self._unpublished = {}
+            self._published_at = now
+        persist_due = now - self._persisted_at >= self.persist_interval
+        if self._unpersisted and (force or persist_due):
+            MarketRepository().update_prices(session, self._unpersisted)
+            session.commit()
+            self._unpersisted = {}
+            self._persisted_at = now
+
+
+def run(source: PriceSource) -> None:
+    feed = PriceFeed(
+        settings.PRICE_PUBLISH_INTERVAL_MS / 1000,
+        settings.PRICE_PERSIST_INTERVAL_SECONDS,
+    )
+    with Session(engine) as session:
+        for tick in source.ticks(timeout=feed.publish_interval):
+            if tick:
+                feed.add(tick)
+            feed.flush(session, force=stop.is_set())
+            if stop.is_set():
+                break
+
+
+def main() -> None:
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    logger.info("Starting price feed from %s", settings.PRICE_FEED_URL)
+    market_catalog.start(engine)
+    try:
+        run(price_source(settings.PRICE_FEED_URL))
+    finally:
+        market_catalog.stop()
+    logger.info("Price feed stopped")
+
+
+if __name__ == "__main__":
+    main()
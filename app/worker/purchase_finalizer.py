@@ -0,0 +1,166 @@
+import logging
+import signal
+import threading
+from functools import partial
+
+from sqlmodel import Session
+
+from app.adapters import (
+    PurchaseRepository,
+    SettlementOutboxRepository,
+    TransactionRepository,
+    WalletRepository,
+    publish_purchase_events,
+)
+from app.core.config import settings
+from app.core.db import engine
+from app.core.metrics import metrics
+from app.core.retry import run_with_retry
+from app.models import (
+    Purchase,
+    PurchaseStatus,
+    SettlementOutbox,
+    Transaction,
+    TransactionStatus,
+    TransactionType,
+    WalletUpdate,
+)
+from app.worker.tasks import get_market
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+stop = threading.Event()
+
+
+def finalize_batch(session: Session, limit: int) -> int:
+    """
+    Completes up to `limit` queued purchases in one transaction: the locked
+    cost leaves the qoute wallet, the base wallet is credited, the ledger
+    and outbox rows are written in bulk and each wallet is updated once
+    however many purchases touch it.
+
+    A purchase whose wallets are gone or whose locked funds don't cover it
+    fails and gives back what it locked.
+    """
+    purchase_repository = PurchaseRepository()
+    purchases = purchase_repository.lock_pending(session, limit)
+    if not purchases:
+        session.rollback()
+        return 0
+
+    markets = {
+        purchase.market_id: get_market(session, purchase.market_id)
+        for purchase in purchases
+    }
+    wallets = WalletRepository().get_by_owners_for_update(
+        session,
+        [
+            (purchase.user_id, currency_id)
+            for purchase in purchases
+            for currency_id in (
+                markets[purchase.market_id].base_currency_id,
+                markets[purchase.market_id].qoute_currency_id,
+            )
+        ],
+    )
+    balances = {key: wallet.balance for key, wallet in wallets.items()}
+    locked = {key: wallet.locked for key, wallet in wallets.items()}
+
+    done: list[Purchase] = []
+    transactions: list[Transaction] = []
+    for purchase in purchases:
+        market = markets[purchase.market_id]
+        base_key = (purchase.user_id, market.base_currency_id)
+        qoute_key = (purchase.user_id, market.qoute_currency_id)
+        if qoute_key not in wallets:
+            purchase.status = PurchaseStatus.FAILED
+            continue
+        # Never release more than is locked
+        release = min(purchase.price, locked[qoute_key])
+        locked[qoute_key] -= release
+        if base_key not in wallets or release < purchase.price:
+            purchase.status = PurchaseStatus.FAILED
+            continue
+        balances[qoute_key] -= purchase.price
+        balances[base_key] += purchase.amount
+        transactions.append(
+            Transaction(
+                amount=purchase.amount,
+                status=TransactionStatus.DONE,
+                type=TransactionType.CREDIT,
+                wallet_id=wallets[base_key].id,
+            )
+        )
+        transactions.append(
+            Transaction(
+                amount=purchase.price,
+                status=TransactionStatus.DONE,
+                type=TransactionType.DEBT,
+                wallet_id=wallets[qoute_key].id,
+            )
+        )
+        purchase.status = PurchaseStatus.DONE
+        done.append(purchase)
+
+    wallet_repository = WalletRepository()
+    for key, wallet in wallets.items():
+        if balances[key] != wallet.balance or locked[key] != wallet.locked:
+            wallet_repository.update_instance(
+                session, wallet, WalletUpdate(balance=balances[key], locked=locked[key])
+            )
+    # Purchase statuses are flushed with the commit
+    TransactionRepository().new_many(session, transactions)
+    SettlementOutboxRepository().new_many(
+        session,
+        [
+            SettlementOutbox(purchase_id=purchase.id, market_id=purchase.market_id)
+            for purchase in done
+        ],
+    )
+    # Completed purchases are announced by the outbox relay with their
+    # outbox rows, only the failed ones end here
+    publish_purchase_events(
+        session,
+        [
+            purchase
+            for purchase in purchases
+            if purchase.status == PurchaseStatus.FAILED
+        ],
+    )
+    session.commit()
+    metrics.incr("purchase.finalized", len(done))
+    metrics.incr("purchase.finalize_failed", len(purchases) - len(done))
+    return len(purchases)
+
+
+def run() -> None:
+    interval = settings.PURCHASE_FINALIZE_INTERVAL_MS / 1000
+    while not stop.is_set():
+        try:
+            with Session(engine) as session:
+                count = run_with_retry(
+                    session,
+                    partial(
+                        finalize_batch, session, settings.PURCHASE_FINALIZE_BATCH_SIZE
+                    ),
+                    "purchase.finalize",
+                )
+        except Exception:
+            logger.exception("Purchase finalize pass failed")
+            count = 0
+        # Keep draining while full batches are waiting
+        if count < settings.PURCHASE_FINALIZE_BATCH_SIZE:
+            stop.wait(interval)
+
+
+def main() -> None:
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    logger.info("Starting purchase finalizer")
+    run()
+    logger.info("Purchase finalizer stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import logging
+import signal
+import threading
+import time
+from collections import defaultdict
+from functools import partial
+
+from kombu import Message
+from sqlalchemy.exc import DBAPIError
+from sqlmodel import Session
+
+from app.adapters import PurchaseRepository, exchange_client, market_catalog
+from app.core.config import settings
+from app.core.db import engine
+from app.core.metrics import metrics
+from app.core.retry import run_with_retry
+from app.models import Purchase
+from app.worker.celery import app, dead_letter_queue, settlement_queue
+from app.worker.tasks import (
+    get_market,
+    settle_purchases,
+    settle_unsettled,
+    try_merge_settlements,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+stop = threading.Event()
+
+
+def purchase_ids(message: Message) -> list[str]:
+    # Celery protocol 2 bodies are (args, kwargs, embed)
+    _, kwargs, _ = message.decode()
+    if "purchases" in kwargs:
+        return list(kwargs["purchases"])
+    if "purchase" in kwargs:
+        return [kwargs["purchase"]]
+    logger.warning("Dropping unexpected message %s", message.headers.get("task"))
+    return []
+
+
+def settle_batch(session: Session, messages: list[Message]) -> None:
+    """
+    Applies a drained batch of settle_purchase(s) messages with one purchase
+    lookup for the whole batch and one locked read and commit per market.
+
+    Markets commit one by one, so after a failed batch its messages are
+    settled again one at a time. Markets that already committed have their
+    purchases marked settled and skip them the second time.
+    """
+    ids = [purchase_id for message in messages for purchase_id in purchase_ids(message)]
+    by_market: dict[int, list[Purchase]] = defaultdict(list)
+    for purchase in PurchaseRepository().get_by_ids(session, ids):
+        by_market[purchase.market_id].append(purchase)
+    for market_id, purchases in by_market.items():
+        market = get_market(session, market_id)
+        try:
+            run_with_retry(
+                session,
+                partial(
+                    settle_unsettled,
+                    session,
+                    market,
+                    [str(purchase.id) for purchase in purchases],
+                ),
+                "settlement.batch",
+            )
+        except DBAPIError as exc:
+            dead_letter(market_id, purchases, exc)
+            continue
+        try_merge_settlements(session, market)
+
+
+def dead_letter(market_id: int, purchases: list[Purchase], exc: DBAPIError) -> None:
+    metrics.incr("settlement.batch.dead_lettered")
+    logger.error(
+        "Dead lettering %s purchases of market %s: %r", len(purchases), market_id, exc
+    )
+    settle_purchases.apply_async(
+        kwargs={
+            "market": market_id,
+            "purchases": [str(purchase.id) for purchase in purchases],
+        },
+        queue=dead_letter_queue.name,
+        headers={"x-dead-letter-reason": repr(exc)},
+    )
+
+
+def retry_or_dead_letter(message: Message, exc: BaseException) -> None:
+    """
+    Publishes a message that failed on its own again with its retry count
+    bumped, or parks it on the dead letter queue once SETTLEMENT_MAX_RETRIES
+    is used up, like CustomTask.retry_or_dead_letter does for the tasks.
+    """
+    try:
+        args, kwargs, _ = message.decode()
+    except Exception:
+        logger.exception("Rejecting undecodable message %s", message.delivery_tag)
+        metrics.incr("settlement.batch.rejected")
+        message.reject()
+        return
+    retries = message.headers.get("retries") or 0
+    if retries < settings.SETTLEMENT_MAX_RETRIES:
+        metrics.incr("settlement.batch.retries")
+        app.send_task(
+            message.headers["task"],
+            args=args,
+            kwargs=kwargs,
+            queue=settlement_queue.name,
+            retries=retries + 1,
+        )
+    else:
+        metrics.incr("settlement.batch.dead_lettered")
+        logger.error("Dead lettering %s: %r", message.headers.get("id"), exc)
+        app.send_task(
+            message.headers["task"],
+            args=args,
+            kwargs=kwargs,
+            queue=dead_letter_queue.name,
+            headers={"x-dead-letter-reason": repr(exc)},
+        )
+    message.ack()
+
+
+def settle_message(message: Message) -> None:
+    try:
+        with Session(engine) as session:
+            settle_batch(session, [message])
+    except Exception as exc:
+        logger.exception("Settling message %s failed", message.headers.get("id"))
+        retry_or_dead_letter(message, exc)
+        return
+    message.ack()
+
+
+def drain(connection, messages: list[Message]) -> None:
+    deadline = time.monotonic() + settings.SETTLEMENT_BATCH_MAX_WAIT_MS / 1000
+    while len(messages) < settings.SETTLEMENT_BATCH_SIZE and not stop.is_set():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        try:
+            connection.drain_events(timeout=remaining)
+        except TimeoutError:
+            return
+
+
+def run() -> None:
+    with app.connection_for_read() as connection:
+        messages: list[Message] = []
+        consumer = connection.Consumer(
+            [settlement_queue],
+            callbacks=[lambda body, message: messages.append(message)],
+            prefetch_count=settings.SETTLEMENT_BATCH_SIZE,
+        )
+        with consumer:
+            while not stop.is_set():
+                # Block for the first message, then top up for a short window
+                try:
+                    connection.drain_events(timeout=1)
+                except TimeoutError:
+                    continue
+                drain(connection, messages)
+                batch = messages.copy()
+                messages.clear()
+                try:
+                    with Session(engine) as session:
+                        settle_batch(session, batch)
+                except Exception:
+                    logger.exception(
+                        "Settling a batch of %s messages failed", len(batch)
+                    )
+                    # Isolates the messages that fail on their own, the rest
+                    # settle and are acked
+                    for message in batch:
+                        settle_message(message)
+                    continue
+                for message in batch:
+                    message.ack()
+
+
+def main() -> None:
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    market_catalog.start(engine)
+    logger.info("Starting settlement batch consumer")
+    try:
+        run()
+    finally:
+        market_catalog.stop()
+        exchange_client.close()
+    logger.info("Settlement batch consumer stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import logging
+import signal
+import threading
+from collections import defaultdict
+from decimal import Decimal
+
+from sqlmodel import Session
+
+from app.adapters import (
+    OrderLeg,
+    SettlementRepository,
+    exchange_client,
+    publish_settlement_events,
+)
+from app.core.config import settings
+from app.core.db import engine
+from app.core.metrics import metrics
+from app.models import SettlementStatus
+from app.worker.tasks import get_market
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+stop = threading.Event()
+
+
+def dispatch_batch(session: Session, limit: int) -> int:
+    """
+    Claims up to `limit` closed settlement orders across all markets, sends
+    them to the exchange as multi-leg orders and records the fills with one
+    bulk update.
+
+    Claimed orders are committed IN_FLIGHT before the exchange is called, so
+    a crash leaves them to resend_settlement_orders. Legs the exchange did
+    not fill are marked FAILED and resent by the same task.
+    """
+    settlement_repository = SettlementRepository()
+    rows = settlement_repository.claim_closed_orders(session, limit)
+    session.commit()
+    if not rows:
+        return 0
+
+    amounts: dict[str, Decimal] = defaultdict(Decimal)
+    markets: dict[str, int] = {}
+    for row in rows:
+        amounts[row.order_id] += row.amount
+        markets[row.order_id] = row.market_id
+    legs = [
+        OrderLeg(
+            symbol=get_market(session, markets[order_id]).symbol,
+            amount=amount,
+            client_order_id=order_id,
+        )
+        for order_id, amount in amounts.items()
+    ]
+    with metrics.timer("settlement.dispatch"):
+        fills = exchange_client.buy_many(legs)
+    settlement_repository.record_fills(session, fills)
+    settlement_repository.mark_orders_failed(
+        session, [order_id for order_id in amounts if order_id not in fills]
+    )
+    publish_settlement_events(
+        session,
+        [
+            (
+                markets[order_id],
+                order_id,
+                SettlementStatus.SETTLED
+                if order_id in fills
+                else SettlementStatus.FAILED,
+            )
+            for order_id in amounts
+        ],
+    )
+    session.commit()
+    metrics.incr("settlement.dispatched", len(fills))
+    return len(amounts)
+
+
+def run() -> None:
+    window = settings.SETTLEMENT_DISPATCH_WINDOW_MS / 1000
+    while not stop.is_set():
+        try:
+            with Session(engine) as session:
+                count = dispatch_batch(session, settings.SETTLEMENT_DISPATCH_MAX_ORDERS)
+        except Exception:
+            logger.exception("Settlement dispatch pass failed")
+            count = 0
+        # Closed orders collect for one window, unless a full batch is waiting
+        if count < settings.SETTLEMENT_DISPATCH_MAX_ORDERS:
+            stop.wait(window)
+
+
+def main() -> None:
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    logger.info("Starting settlement dispatcher")
+    run()
+    exchange_client.close()
+    logger.info("Settlement dispatcher stopped")
+
+
+if __name__ == "__main__":
+    main()
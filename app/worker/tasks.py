@@ -1,51 +1,322 @@
+import uuid
+from collections import defaultdict
+from collections.abc import Iterable
+from datetime import datetime, timedelta, timezone
+from functools import partial
 from logging import getLogger
 from decimal import Decimal
+from typing import Any
 
-from sqlalchemy.exc import OperationalError
-from app.adapters import PurchaseRepository, SettlementRepository, MarketRepository
-from app.models import Settlement, SettlementUpdate
+from celery import group
+from sqlalchemy import Row
+from sqlalchemy.exc import DBAPIError
+from app.adapters import (
+    ExchangeError,
+    IdempotencyKeyRepository,
+    PurchaseRepository,
+    ReconciliationRepository,
+    SettlementRepository,
+    MarketRepository,
+    exchange_client,
+    market_catalog,
+    publish_settlement_events,
+)
+from app.models import Market, Purchase, SettlementStatus, SettlementUpdate
 from .celery import app
-from app.core.db import engine
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.retry import run_with_retry
 from sqlmodel import Session
 
 logger = getLogger(__name__)
 
 THRESHOLD = 10.0
 
+MAX_WALLET_ID = uuid.UUID(int=2**128 - 1)
 
-@app.task(bind=True)
+
+@app.task(bind=True, max_retries=settings.SETTLEMENT_MAX_RETRIES)
 def settle_purchase(self, *, purchase: str) -> None:
     try:
-        with Session(engine).no_autoflush as session:
+        with self.db.no_autoflush as session:
             purchase = PurchaseRepository().get_by_id(session, purchase)
-            market = MarketRepository().get_by_id(session, purchase.market_id)
-            settlement_repository = SettlementRepository()
-            settlement = SettlementRepository().get_active_lock(
-                session, purchase.market_id
-            )
-            if not settlement:
-                settlement = Settlement(amount=Decimal(0.0), active=True, market_id=market.id)
-                settlement = settlement_repository.create(session, settlement)
+            market = get_market(session, purchase.market_id)
+            settle_unsettled(session, market, [str(purchase.id)])
+    except DBAPIError as exc:
+        self.db.rollback()
+        self.retry_or_dead_letter(exc)
+    try_merge_settlements(self.db, market)
 
-            settlement_update = SettlementUpdate(
-                amount=purchase.amount + settlement.amount
-            )
-            settlement = settlement_repository.update_instance(
-                session, settlement, settlement_update
+
+@app.task(bind=True, max_retries=settings.SETTLEMENT_MAX_RETRIES)
+def settle_purchases(self, *, market: int, purchases: list[str]) -> None:
+    """
+    Settles all purchases of a batch that belong to one market, taking each
+    settlement stripe lock at most once.
+    """
+    try:
+        with self.db.no_autoflush as session:
+            market = get_market(session, market)
+            settle_unsettled(session, market, purchases)
+    except DBAPIError as exc:
+        self.db.rollback()
+        self.retry_or_dead_letter(exc)
+    try_merge_settlements(self.db, market)
+
+
+@app.task(bind=True)
+def purge_idempotency_keys(self) -> int:
+    """
+    Deletes expired idempotency keys in small batches, committing after each
+    one so the purge never holds many row locks or a long transaction.
+    """
+    deleted = 0
+    while True:
+        count = IdempotencyKeyRepository().delete_expired(
+            self.db, settings.IDEMPOTENCY_KEY_PURGE_BATCH_SIZE
+        )
+        self.db.commit()
+        deleted += count
+        if count < settings.IDEMPOTENCY_KEY_PURGE_BATCH_SIZE:
+            return deleted
+
+
+@app.task(bind=True)
+def resend_settlement_orders(self) -> int:
+    """
+    Sends failed or stuck settlement orders to the exchange again. Orders
+    keep their client order id, so the exchange won't fill one twice.
+    """
+    in_flight_before = datetime.now(timezone.utc) - timedelta(
+        seconds=settings.SETTLEMENT_RESEND_AFTER_SECONDS
+    )
+    orders = SettlementRepository().get_unconfirmed_orders(self.db, in_flight_before)
+    for order in orders:
+        market = get_market(self.db, order.market_id)
+        send_order(self.db, market, order.order_id, order.amount)
+    return len(orders)
+
+
+@app.task
+def reconcile_balances() -> int:
+    """
+    Splits the wallet id space into RECONCILIATION_RANGES slices and checks
+    each on its own worker, all against one shared watermark.
+    """
+    watermark = datetime.now(timezone.utc) - timedelta(
+        seconds=settings.RECONCILIATION_WATERMARK_LAG_SECONDS
+    )
+    ranges = wallet_ranges(settings.RECONCILIATION_RANGES)
+    group(
+        reconcile_wallet_range.s(
+            start=str(start), end=str(end), watermark=watermark.isoformat()
+        )
+        for start, end in ranges
+    ).apply_async()
+    return len(ranges)
+
+
+@app.task(bind=True)
+def reconcile_wallet_range(self, *, start: str, end: str, watermark: str) -> int:
+    """
+    Compares the balances of the wallets with ids in [start, end] to their
+    last checkpoint plus the ledger rows written since, then moves the
+    checkpoint to `watermark`. Returns the number of drifting wallets.
+
+    A wallet without a checkpoint is checked against its whole ledger from a
+    zero opening balance, so drift that predates the first run is reported
+    once and then carried in the checkpoint.
+    """
+    reconciliation_repository = ReconciliationRepository()
+    page_start = uuid.UUID(start)
+    page_end = uuid.UUID(end)
+    new_watermark = datetime.fromisoformat(watermark)
+    drifted = 0
+    while True:
+        rows = reconciliation_repository.check_page(
+            self.db,
+            page_start,
+            page_end,
+            new_watermark,
+            settings.RECONCILIATION_PAGE_SIZE,
+        )
+        checked_at = datetime.now(timezone.utc)
+        checkpoints = []
+        for row in rows:
+            opening = row.checkpoint_balance or Decimal(0)
+            drift = row.balance - (opening + row.since_checkpoint)
+            if drift:
+                drifted += 1
+                logger.warning("Wallet %s drifted by %s", row.wallet_id, drift)
+            checkpoints.append(
+                {
+                    "wallet_id": row.wallet_id,
+                    # The balance the wallet had at the watermark
+                    "balance": row.balance - row.since_watermark,
+                    "watermark": new_watermark,
+                    "drift": drift,
+                    "checked_at": checked_at,
+                }
             )
-            # If threshold is reached, process the batch
-            if (settlement.amount * market.price) >= THRESHOLD:
-                settlement_update = SettlementUpdate(active=False)
-                settlement = settlement_repository.update_instance(
-                    session, settlement, settlement_update
-                )
-                buy_from_exchange(market.symbol, settlement.amount) 
-            session.commit()
-    except OperationalError:
-        # TODO: Handle dead lock or etc
-        pass
-
-
-def buy_from_exchange(market_symbol: str, amount: Decimal):
-    # Simulated third-party API request
-    print(f"Sending data to third party: {market_symbol} {amount}")
+        reconciliation_repository.save_checkpoints(self.db, checkpoints)
+        self.db.commit()
+        metrics.incr("reconciliation.wallets", len(rows))
+        if len(rows) < settings.RECONCILIATION_PAGE_SIZE:
+            break
+        page_start = uuid.UUID(int=rows[-1].wallet_id.int + 1)
+    metrics.incr("reconciliation.drifted", drifted)
+    if drifted:
+        logger.error(
+            "%s wallets in %s..%s drifted from the ledger", drifted, start, end
+        )
+    return drifted
+
+
+def wallet_ranges(count: int) -> list[tuple[uuid.UUID, uuid.UUID]]:
+    # The last range also takes the remainder of the division
+    step = (MAX_WALLET_ID.int + 1) // count
+    ends = [uuid.UUID(int=(index + 1) * step - 1) for index in range(count - 1)]
+    ends.append(MAX_WALLET_ID)
+    return [(uuid.UUID(int=index * step), end) for index, end in enumerate(ends)]
+
+
+def get_market(session: Session, market_id: int) -> Market:
+    return market_catalog.get_by_id(market_id) or MarketRepository().get_by_id(
+        session, market_id
+    )
+
+
+def settlement_stripe(purchase_id: uuid.UUID) -> int:
+    return purchase_id.int % settings.SETTLEMENT_STRIPES
+
+
+def amounts_by_stripe(purchases: Iterable[Purchase | Row[Any]]) -> dict[int, Decimal]:
+    amounts: dict[int, Decimal] = defaultdict(Decimal)
+    for purchase in purchases:
+        amounts[settlement_stripe(purchase.id)] += purchase.amount
+    return amounts
+
+
+def settle_unsettled(session: Session, market: Market, purchase_ids: list[str]) -> int:
+    """
+    Adds the amounts of the purchases that aren't settled yet to the market's
+    stripes and marks them settled in the same commit. Settlement messages
+    are delivered at least once, a redelivery finds its purchases settled
+    and changes nothing. Returns the number of purchases applied.
+    """
+    purchases = PurchaseRepository().claim_unsettled(session, purchase_ids)
+    if not purchases:
+        session.rollback()
+        return 0
+    settle_amounts(session, market, amounts_by_stripe(purchases))
+    return len(purchases)
+
+
+def settle_amounts(
+    session: Session, market: Market, amounts: dict[int, Decimal]
+) -> None:
+    """
+    Adds purchase amounts to the market's active settlement stripes with one
+    locked read and one commit, so stripe locks are only held for this small
+    update.
+    """
+    add_settlement_amounts(session, market, amounts)
+    session.commit()
+
+
+def add_settlement_amounts(
+    session: Session, market: Market, amounts: dict[int, Decimal]
+) -> None:
+    settlement_repository = SettlementRepository()
+    with metrics.timer("settlement.lock_wait"):
+        settlements = settlement_repository.get_active_stripes_lock(
+            session, market.id, amounts
+        )
+    if missing := amounts.keys() - settlements.keys():
+        for stripe in sorted(missing):
+            settlement_repository.create_active(session, market.id, stripe)
+        settlements.update(
+            settlement_repository.get_active_stripes_lock(session, market.id, missing)
+        )
+
+    for stripe, amount in amounts.items():
+        settlement = settlements[stripe]
+        settlement_update = SettlementUpdate(amount=amount + settlement.amount)
+        settlement_repository.update_instance(session, settlement, settlement_update)
+
+
+def merge_settlements(session: Session, market: Market) -> tuple[str, Decimal] | None:
+    """
+    Closes all active stripes of a market into one exchange order once their
+    combined value crosses THRESHOLD, returning its client order id and
+    amount. Only one worker merges a market at a time, the others skip
+    instead of queueing on the stripe locks.
+
+    With batched dispatch the order is left CLOSED for the settlement
+    dispatcher, otherwise it goes IN_FLIGHT and the caller sends it.
+    """
+    settlement_repository = SettlementRepository()
+    price = market_catalog.get_price(market)
+    # Cheap unlocked read first, most settlements stay under the threshold
+    pending = settlement_repository.get_active_amount(session, market.id)
+    if pending * price < THRESHOLD:
+        return None
+    if not settlement_repository.try_lock_market(session, market.id):
+        session.rollback()
+        return None
+
+    with metrics.timer("settlement.merge_lock_wait"):
+        settlements = settlement_repository.get_all_active_lock(session, market.id)
+    amount = sum((settlement.amount for settlement in settlements), Decimal(0))
+    # If threshold is reached, process the batch
+    if amount * price < THRESHOLD:
+        session.rollback()
+        return None
+    order_id = f"settlement-{settlements[0].id}"
+    status = (
+        SettlementStatus.CLOSED
+        if settings.SETTLEMENT_DISPATCH == "batched"
+        else SettlementStatus.IN_FLIGHT
+    )
+    settlement_update = SettlementUpdate(active=False, status=status, order_id=order_id)
+    for settlement in settlements:
+        settlement_repository.update_instance(session, settlement, settlement_update)
+    publish_settlement_events(session, [(market.id, order_id, status)])
+    session.commit()
+    return order_id, amount
+
+
+def try_merge_settlements(session: Session, market: Market) -> None:
+    try:
+        order = run_with_retry(
+            session, partial(merge_settlements, session, market), "settlement.merge"
+        )
+    except DBAPIError:
+        # The amounts are already committed, the market's next settlement
+        # attempts the merge again
+        logger.exception("Merging settlements of market %s failed", market.id)
+        return
+    if order and settings.SETTLEMENT_DISPATCH == "direct":
+        # The stripe locks are released before the exchange is called
+        send_order(session, market, *order)
+
+
+def send_order(
+    session: Session, market: Market, order_id: str, amount: Decimal
+) -> None:
+    settlement_repository = SettlementRepository()
+    try:
+        transaction_code = buy_from_exchange(market.symbol, amount, order_id)
+    except ExchangeError as e:
+        logger.warning("Exchange order %s failed: %s", order_id, e)
+        status = SettlementStatus.FAILED
+        transaction_code = None
+    else:
+        status = SettlementStatus.SETTLED
+    settlement_repository.mark_order(session, order_id, status, transaction_code)
+    publish_settlement_events(session, [(market.id, order_id, status)])
+    session.commit()
+
+
+def buy_from_exchange(market_symbol: str, amount: Decimal, client_order_id: str) -> str:
+    return exchange_client.buy(market_symbol, amount, client_order_id)